@@ -0,0 +1,151 @@
+"""add users.strategy_count and conversation_sessions
+
+Revision ID: 3f2a9c1d7e45
+Revises: 
+Create Date: 2026-10-16 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7e45'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# 会话列表中最后一条消息的预览长度（与对话记录写入器一致）
+PREVIEW_LENGTH = 50
+
+# 回填会话预览时每批更新的行数
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _has_table(bind, table_name: str) -> bool:
+    return sa.inspect(bind).has_table(table_name)
+
+
+def _has_column(bind, table_name: str, column_name: str) -> bool:
+    return any(column["name"] == column_name for column in sa.inspect(bind).get_columns(table_name))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    
+    # 1. 用户策略数量（init_db的create_all不会为已有表补列）
+    if not _has_column(bind, "users", "strategy_count"):
+        op.add_column(
+            "users",
+            sa.Column("strategy_count", sa.Integer(), nullable=False, server_default="0",
+                      comment="策略数量（创建策略时累加）")
+        )
+    
+    users = sa.table("users", sa.column("id", sa.Integer), sa.column("strategy_count", sa.Integer))
+    strategies = sa.table("strategies", sa.column("id", sa.Integer), sa.column("user_id", sa.Integer))
+    
+    # 与原先len(user.strategies)一致：统计全部策略（含软删除）
+    op.execute(
+        users.update().values(
+            strategy_count=sa.select(sa.func.count(strategies.c.id))
+            .where(strategies.c.user_id == users.c.id)
+            .scalar_subquery()
+        )
+    )
+    
+    # 2. 会话汇总表（应用启动时create_all可能已创建空表）
+    if not _has_table(bind, "conversation_sessions"):
+        op.create_table(
+            "conversation_sessions",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False, comment="用户ID"),
+            sa.Column("session_id", sa.String(100), nullable=False, comment="会话ID"),
+            sa.Column("message_count", sa.Integer(), nullable=False, server_default="0", comment="消息数量"),
+            sa.Column("last_message_preview", sa.String(60), nullable=True,
+                      comment="最后一条消息预览（前50个字符）"),
+            sa.Column("last_message_time", sa.DateTime(), nullable=True, comment="最后一条消息时间"),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False, comment="创建时间"),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False, comment="更新时间"),
+        )
+        op.create_index("ix_conversation_sessions_id", "conversation_sessions", ["id"])
+        op.create_index(
+            "idx_conversation_sessions_user_session",
+            "conversation_sessions",
+            ["user_id", "session_id"],
+            unique=True
+        )
+        op.create_index(
+            "idx_conversation_sessions_user_last_time",
+            "conversation_sessions",
+            ["user_id", sa.text("last_message_time DESC")]
+        )
+    
+    conversation_sessions = sa.table(
+        "conversation_sessions",
+        sa.column("user_id", sa.Integer),
+        sa.column("session_id", sa.String),
+        sa.column("message_count", sa.Integer),
+        sa.column("last_message_preview", sa.String),
+        sa.column("last_message_time", sa.DateTime),
+    )
+    conversations = sa.table(
+        "conversations",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("session_id", sa.String),
+        sa.column("content", sa.Text),
+        sa.column("created_at", sa.DateTime),
+    )
+    
+    # 以对话记录为准重建会话汇总（覆盖迁移前已写入的部分汇总）
+    op.execute(conversation_sessions.delete())
+    op.execute(
+        conversation_sessions.insert().from_select(
+            ["user_id", "session_id", "message_count", "last_message_time"],
+            sa.select(
+                conversations.c.user_id,
+                conversations.c.session_id,
+                sa.func.count(conversations.c.id),
+                sa.func.max(conversations.c.created_at)
+            ).group_by(conversations.c.user_id, conversations.c.session_id)
+        )
+    )
+    
+    # 回填最后一条消息预览：按会话取最后插入的一条消息，分批在Python中截取（截取规则与写入器一致）
+    last_ids = [
+        row[0] for row in bind.execute(
+            sa.select(sa.func.max(conversations.c.id))
+            .group_by(conversations.c.user_id, conversations.c.session_id)
+        )
+    ]
+    
+    update_preview = (
+        conversation_sessions.update()
+        .where(
+            conversation_sessions.c.user_id == sa.bindparam("b_user_id"),
+            conversation_sessions.c.session_id == sa.bindparam("b_session_id")
+        )
+        .values(last_message_preview=sa.bindparam("b_preview"))
+    )
+    
+    for start in range(0, len(last_ids), BACKFILL_BATCH_SIZE):
+        batch = bind.execute(
+            sa.select(conversations.c.user_id, conversations.c.session_id, conversations.c.content)
+            .where(conversations.c.id.in_(last_ids[start:start + BACKFILL_BATCH_SIZE]))
+        ).all()
+        bind.execute(update_preview, [
+            {
+                "b_user_id": user_id,
+                "b_session_id": session_id,
+                "b_preview": content[:PREVIEW_LENGTH] + "..." if len(content) > PREVIEW_LENGTH else content
+            }
+            for user_id, session_id, content in batch
+        ])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_conversation_sessions_user_last_time", table_name="conversation_sessions")
+    op.drop_index("idx_conversation_sessions_user_session", table_name="conversation_sessions")
+    op.drop_index("ix_conversation_sessions_id", table_name="conversation_sessions")
+    op.drop_table("conversation_sessions")
+    op.drop_column("users", "strategy_count")
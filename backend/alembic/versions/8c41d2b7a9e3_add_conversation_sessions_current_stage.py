@@ -0,0 +1,99 @@
+"""add conversation_sessions.current_stage
+
+Revision ID: 8c41d2b7a9e3
+Revises: 3f2a9c1d7e45
+Create Date: 2026-10-16 18:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2b7a9e3'
+down_revision = '3f2a9c1d7e45'
+branch_labels = None
+depends_on = None
+
+# 回填会话阶段时每批更新的行数
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _has_column(bind, table_name: str, column_name: str) -> bool:
+    return any(column["name"] == column_name for column in sa.inspect(bind).get_columns(table_name))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    
+    if not _has_column(bind, "conversation_sessions", "current_stage"):
+        op.add_column(
+            "conversation_sessions",
+            sa.Column("current_stage", sa.String(50), nullable=True, comment="最后一条消息所处的业务阶段")
+        )
+    
+    conversation_sessions = sa.table(
+        "conversation_sessions",
+        sa.column("user_id", sa.Integer),
+        sa.column("session_id", sa.String),
+        sa.column("created_at", sa.DateTime),
+        sa.column("current_stage", sa.String),
+    )
+    conversations = sa.table(
+        "conversations",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("session_id", sa.String),
+        sa.column("context_data", sa.JSON),
+        sa.column("created_at", sa.DateTime),
+    )
+    
+    # 会话创建时间取第一条消息时间（上一版本回填时为迁移执行时间）
+    op.execute(
+        conversation_sessions.update().values(
+            created_at=sa.select(sa.func.min(conversations.c.created_at))
+            .where(
+                conversations.c.user_id == conversation_sessions.c.user_id,
+                conversations.c.session_id == conversation_sessions.c.session_id
+            )
+            .scalar_subquery()
+        )
+    )
+    
+    # 回填当前阶段：按会话取最后插入的一条消息，分批在Python中读取上下文中的阶段
+    last_ids = [
+        row[0] for row in bind.execute(
+            sa.select(sa.func.max(conversations.c.id))
+            .group_by(conversations.c.user_id, conversations.c.session_id)
+        )
+    ]
+    
+    update_stage = (
+        conversation_sessions.update()
+        .where(
+            conversation_sessions.c.user_id == sa.bindparam("b_user_id"),
+            conversation_sessions.c.session_id == sa.bindparam("b_session_id")
+        )
+        .values(current_stage=sa.bindparam("b_stage"))
+    )
+    
+    for start in range(0, len(last_ids), BACKFILL_BATCH_SIZE):
+        batch = bind.execute(
+            sa.select(conversations.c.user_id, conversations.c.session_id, conversations.c.context_data)
+            .where(conversations.c.id.in_(last_ids[start:start + BACKFILL_BATCH_SIZE]))
+        ).all()
+        stages = [
+            {
+                "b_user_id": user_id,
+                "b_session_id": session_id,
+                "b_stage": context_data.get("stage")
+            }
+            for user_id, session_id, context_data in batch
+            if isinstance(context_data, dict) and context_data.get("stage")
+        ]
+        if stages:
+            bind.execute(update_stage, stages)
+
+
+def downgrade() -> None:
+    op.drop_column("conversation_sessions", "current_stage")
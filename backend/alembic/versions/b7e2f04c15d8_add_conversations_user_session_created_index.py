@@ -0,0 +1,36 @@
+"""add conversations(user_id, session_id, created_at DESC) index
+
+Revision ID: b7e2f04c15d8
+Revises: 8c41d2b7a9e3
+Create Date: 2026-10-16 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f04c15d8'
+down_revision = '8c41d2b7a9e3'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "idx_conversations_user_session_created"
+
+
+def upgrade() -> None:
+    # init_db的create_all不会为已有表补建索引
+    indexes = sa.inspect(op.get_bind()).get_indexes("conversations")
+    if any(index["name"] == INDEX_NAME for index in indexes):
+        return
+    
+    op.create_index(
+        INDEX_NAME,
+        "conversations",
+        ["user_id", "session_id", sa.text("created_at DESC")],
+        postgresql_include=["message_type", "round_number"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="conversations")
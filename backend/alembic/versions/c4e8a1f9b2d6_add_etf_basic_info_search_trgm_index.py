@@ -0,0 +1,49 @@
+"""add etf_basic_info trigram search index
+
+Revision ID: c4e8a1f9b2d6
+Revises: b7e2f04c15d8
+Create Date: 2026-10-16 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f9b2d6'
+down_revision = 'b7e2f04c15d8'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "idx_etf_basic_info_search_trgm"
+
+
+def upgrade() -> None:
+    # 三元组索引依赖PostgreSQL的pg_trgm扩展，其他数据库不创建
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    
+    indexes = sa.inspect(bind).get_indexes("etf_basic_info")
+    if any(index["name"] == INDEX_NAME for index in indexes):
+        return
+    
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        INDEX_NAME,
+        "etf_basic_info",
+        ["etf_name", "full_name", "asset_class"],
+        postgresql_using="gin",
+        postgresql_ops={
+            "etf_name": "gin_trgm_ops",
+            "full_name": "gin_trgm_ops",
+            "asset_class": "gin_trgm_ops"
+        }
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    
+    op.drop_index(INDEX_NAME, table_name="etf_basic_info")
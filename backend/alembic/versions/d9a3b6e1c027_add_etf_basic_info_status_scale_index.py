@@ -0,0 +1,35 @@
+"""add etf_basic_info(status, fund_scale DESC) index
+
+Revision ID: d9a3b6e1c027
+Revises: c4e8a1f9b2d6
+Create Date: 2026-10-16 20:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3b6e1c027'
+down_revision = 'c4e8a1f9b2d6'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "idx_etf_basic_info_status_scale"
+
+
+def upgrade() -> None:
+    # init_db的create_all不会为已有表补建索引
+    indexes = sa.inspect(op.get_bind()).get_indexes("etf_basic_info")
+    if any(index["name"] == INDEX_NAME for index in indexes):
+        return
+    
+    op.create_index(
+        INDEX_NAME,
+        "etf_basic_info",
+        ["status", sa.text("fund_scale DESC")]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="etf_basic_info")
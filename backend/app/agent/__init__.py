@@ -1,5 +1,5 @@
 """智能体核心模块"""
-from .agent_core import AgentCore
+from .agent_core import AgentCore, StatusReporter, get_agent_core
 from .business_flow import BusinessFlowManager
 
-__all__ = ["AgentCore", "BusinessFlowManager"]
+__all__ = ["AgentCore", "StatusReporter", "get_agent_core", "BusinessFlowManager"]
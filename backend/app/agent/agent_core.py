@@ -4,63 +4,243 @@ from sqlalchemy.orm import Session
 from langchain.llms.base import LLM
 from langchain.schema import AgentAction, AgentFinish
 from app.tools import *
-from app.agent.business_flow import BusinessFlowManager
-from app.cache.service import CacheService
+from app.agent.business_flow import business_flow_manager
+from app.cache.service import cache_service
+from functools import lru_cache
 import logging
-import json
 import asyncio
+import orjson
+import time
 
 logger = logging.getLogger(__name__)
 
+# 参数依赖：待填充参数名 -> (产出该参数的工具, 工具结果中的字段)
+PARAMETER_PRODUCERS = {
+    "investment_elements": ("element_extraction_tool", "extracted_elements"),
+    "strategy_config": ("strategy_generation_tool", "strategy")
+}
+
+# 固定的任务规划：参数不随消息变化，各轮对话共享（执行时只读，不会被修改）
+NEW_USER_INTRODUCTION_PLAN = (
+    {
+        "tool": "market_news_fetch_tool",
+        "params": {"category": "etf", "limit": 5},
+        "description": "获取ETF市场资讯"
+    },
+)
+
+MARKET_RECOMMENDATION_PLAN = (
+    {
+        "tool": "market_news_fetch_tool",
+        "params": {
+            "keywords": ("ETF", "投资机会"),
+            "limit": 10
+        },
+        "description": "获取市场推荐资讯"
+    },
+)
+
+# 策略生成阶段中要素提取之后的固定任务，空参数由前序任务结果填充
+STRATEGY_GENERATION_TASKS = (
+    {
+        "tool": "etf_data_fetch_tool",
+        "params": {
+            "asset_class": None,
+            "limit": 20
+        },
+        "description": "获取ETF数据"
+    },
+    {
+        "tool": "strategy_generation_tool",
+        "params": {
+            "investment_elements": {},
+            "constraints": {},
+            "optimization_target": "sharpe_ratio"
+        },
+        "description": "生成投资策略"
+    },
+    {
+        "tool": "strategy_backtest_tool",
+        "params": {
+            "strategy_config": {},
+            "backtest_period": 365
+        },
+        "description": "执行策略回测"
+    }
+)
+
+# 各阶段的备用回复（LLM调用失败时使用）
+FALLBACK_RESPONSES = {
+    "new_user_introduction": "欢迎使用ETF资产配置策略系统！我可以帮助您制定个性化的ETF投资策略。请告诉我您的投资偏好和目标。",
+    "element_collection": "我正在了解您的投资需求。请继续告诉我您的风险偏好、目标收益率等信息。",
+    "strategy_generation": "我正在为您生成投资策略，请稍等片刻。",
+    "strategy_optimization": "我会根据您的反馈来优化策略配置。",
+    "market_recommendation": "让我为您推荐一些当前市场上的投资机会。"
+}
+
+DEFAULT_FALLBACK_RESPONSE = "感谢您的咨询，我会尽力为您提供专业的投资建议。"
+
+# 提示词中每类列表结果保留的条数
+PROMPT_TOP_N = 5
+
+# 状态推送最小间隔（秒），间隔内积压的状态只推送最新一条
+STATUS_UPDATE_INTERVAL = 0.05
+
+
+@lru_cache(maxsize=1)
+def get_shared_tools() -> Dict[str, Any]:
+    """获取无状态的共享工具实例（进程内只创建一次）"""
+    return {
+        "strategy_backtest_tool": StrategyBacktestTool(),
+        "strategy_optimization_tool": StrategyOptimizationTool(),
+        "market_news_fetch_tool": MarketNewsFetchTool()
+    }
+
+
+class StatusReporter:
+    """单次对话的状态推送器
+    
+    状态先入队，由后台任务合并推送；回调随每次调用传入，
+    不保存在共享的智能体实例上，避免不同连接之间互相覆盖。
+    """
+    
+    __slots__ = ("callback", "_queue", "_task")
+    
+    def __init__(self, callback: Optional[Callable] = None):
+        self.callback = callback
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def update(self, status: str, message: str):
+        """更新处理状态（入队后由后台任务合并推送）"""
+        if not self.callback:
+            return
+        
+        try:
+            if self._task is None:
+                self._queue = asyncio.Queue()
+                self._task = asyncio.create_task(self._drain())
+            
+            self._queue.put_nowait({
+                "status": status,
+                "message": message,
+                "timestamp": time.monotonic()
+            })
+        except Exception as e:
+            logger.error("状态更新失败: %s", e)
+    
+    async def close(self):
+        """停止后台推送任务，并推送尚未发出的最新状态"""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        
+        status_data = None
+        while not self._queue.empty():
+            status_data = self._queue.get_nowait()
+        if status_data is not None:
+            await self._send(status_data)
+        
+        self._task = None
+        self._queue = None
+    
+    async def _drain(self):
+        """后台推送状态更新，积压的状态只推送最新一条"""
+        queue = self._queue
+        while True:
+            status_data = await queue.get()
+            while not queue.empty():
+                status_data = queue.get_nowait()
+            
+            await self._send(status_data)
+            await asyncio.sleep(STATUS_UPDATE_INTERVAL)
+    
+    async def _send(self, status_data: Dict[str, Any]):
+        try:
+            await self.callback(status_data)
+        except Exception as e:
+            logger.error("状态更新失败: %s", e)
+
 
 class AgentCore:
-    """智能体核心类"""
+    """智能体核心类
     
-    def __init__(self, db: Session, llm: LLM):
-        self.db = db
+    实例不持有数据库会话和状态回调，可在多个连接间共享；
+    数据库会话和状态回调在每次调用process_conversation时传入。
+    """
+    
+    __slots__ = (
+        "llm", "enable_parallel_tool_execution", "cache_service", "business_flow",
+        "tools", "_tool_arun", "_context_write_tasks"
+    )
+    
+    def __init__(self, llm: LLM, enable_parallel_tool_execution: bool = True):
         self.llm = llm
-        self.cache_service = CacheService()
-        self.business_flow = BusinessFlowManager()
+        self.enable_parallel_tool_execution = enable_parallel_tool_execution
+        self.cache_service = cache_service
+        self.business_flow = business_flow_manager
         
-        # 初始化工具
+        # 不依赖数据库会话的工具随实例创建并共享
         self.tools = {
-            "user_identification_tool": UserIdentificationTool(db),
             "element_extraction_tool": ElementExtractionTool(llm),
-            "etf_data_fetch_tool": ETFDataFetchTool(db),
-            "strategy_generation_tool": StrategyGenerationTool(db),
-            "strategy_backtest_tool": StrategyBacktestTool(),
-            "market_news_fetch_tool": MarketNewsFetchTool(),
-            "strategy_optimization_tool": StrategyOptimizationTool()
+            **get_shared_tools()
+        }
+        # 预绑定各工具的异步执行方法，任务执行时直接调用
+        self._tool_arun: Dict[str, Callable] = {
+            name: tool._arun for name, tool in self.tools.items()
         }
         
-        self.status_callback: Optional[Callable] = None
+        # 会话ID -> 未完成的上下文写入任务
+        self._context_write_tasks: Dict[str, asyncio.Task] = {}
     
-    def set_status_callback(self, callback: Callable):
-        """设置状态更新回调函数"""
-        self.status_callback = callback
+    def bind_tools(self, db: Session) -> Dict[str, Callable]:
+        """为一个数据库会话绑定依赖会话的工具，并与共享工具合并
+        
+        WebSocket连接建立时调用一次，连接内的每条消息复用返回的绑定。
+        """
+        return {
+            **self._tool_arun,
+            "user_identification_tool": UserIdentificationTool(db)._arun,
+            "etf_data_fetch_tool": ETFDataFetchTool(db)._arun,
+            "strategy_generation_tool": StrategyGenerationTool(db)._arun
+        }
     
-    async def process_conversation(self, user_id: int, session_id: str, 
-                                 message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """处理对话消息"""
+    async def process_conversation(self, user_id: int, session_id: str, message: str,
+                                 db: Session, context: Dict[str, Any] = None,
+                                 status_callback: Optional[Callable] = None,
+                                 tool_arun: Optional[Dict[str, Callable]] = None) -> Dict[str, Any]:
+        """处理对话消息
+        
+        tool_arun为bind_tools返回的工具绑定，未传入时按本次的数据库会话临时绑定。
+        """
+        status = StatusReporter(status_callback)
         try:
             if context is None:
                 context = {}
             
-            await self._update_status("思考中", "正在分析用户需求和规划任务")
+            if tool_arun is None:
+                tool_arun = self.bind_tools(db)
             
-            # 1. 获取对话上下文
-            conversation_context = await self._get_conversation_context(session_id)
-            conversation_context.update(context)
+            status.update("思考中", "正在分析用户需求和规划任务")
             
-            # 2. 识别用户身份和状态
-            user_info = await self._identify_user(user_id)
+            # 1-2. 并发获取对话上下文（Redis）和识别用户身份（数据库）
+            cached_context, user_info = await asyncio.gather(
+                self._get_conversation_context(session_id),
+                self._identify_user(user_id, tool_arun)
+            )
+            conversation_context = {**cached_context, **context}
             
             # 3. 判断业务流程阶段
             current_stage = self.business_flow.determine_stage(
                 user_info, conversation_context, message
             )
             
-            await self._update_status("数据获取中", f"当前处于{current_stage}阶段")
+            status.update("数据获取中", f"当前处于{current_stage}阶段")
             
             # 4. 生成任务规划
             task_plan = self._generate_task_plan(current_stage, message, conversation_context)
@@ -72,25 +252,25 @@ class AgentCore:
                 "message": message,
                 "context": conversation_context,
                 "user_info": user_info
-            })
+            }, tool_arun, status)
             
-            await self._update_status("结果汇总中", "正在汇总结果生成回复")
+            status.update("结果汇总中", "正在汇总结果生成回复")
             
             # 6. 生成最终回复
             final_response = await self._generate_final_response(
                 execution_result, current_stage, message
             )
             
-            # 7. 更新对话上下文
-            await self._update_conversation_context(session_id, {
+            status.update("完成", "对话处理完成")
+            
+            # 7. 更新对话上下文（后台写入，不阻塞回复）
+            self._update_conversation_context(session_id, {
                 "last_message": message,
                 "last_stage": current_stage,
                 "last_response": final_response,
                 "execution_result": execution_result
             })
             
-            await self._update_status("完成", "对话处理完成")
-            
             return {
                 "success": True,
                 "response": final_response,
@@ -100,41 +280,45 @@ class AgentCore:
             }
             
         except Exception as e:
-            logger.error(f"对话处理失败: {e}")
-            await self._update_status("错误", f"处理失败: {str(e)}")
+            logger.error("对话处理失败: %s", e)
+            status.update("错误", f"处理失败: {str(e)}")
             
             return {
                 "success": False,
                 "error": str(e),
                 "response": "抱歉，处理您的请求时遇到了问题，请稍后再试。"
             }
+        finally:
+            await status.close()
     
-    async def _identify_user(self, user_id: int) -> Dict[str, Any]:
-        """识别用户身份"""
+    async def _identify_user(self, user_id: int,
+                           tool_arun: Dict[str, Callable]) -> Dict[str, Any]:
+        """识别用户身份（短期缓存，避免每轮对话查询数据库）"""
         try:
-            tool = self.tools["user_identification_tool"]
-            result = await tool._arun(user_id=user_id, include_strategies=True)
+            cached_identity = await self.cache_service.get_user_identity(user_id)
+            if cached_identity:
+                return cached_identity
+            
+            result = await tool_arun["user_identification_tool"](
+                user_id=user_id, include_strategies=True
+            )
+            
+            if result.get("success"):
+                await self.cache_service.set_user_identity(user_id, result)
+            
             return result
         except Exception as e:
-            logger.error(f"用户身份识别失败: {e}")
+            logger.error("用户身份识别失败: %s", e)
             return {"success": False, "user_type": "unknown"}
     
     def _generate_task_plan(self, stage: str, message: str, 
                            context: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """生成任务规划"""
-        task_plan = []
-        
+        """生成任务规划（固定任务复用模块级常量，仅动态参数按需构建）"""
         if stage == "new_user_introduction":
-            task_plan = [
-                {
-                    "tool": "market_news_fetch_tool",
-                    "params": {"category": "etf", "limit": 5},
-                    "description": "获取ETF市场资讯"
-                }
-            ]
-            
-        elif stage == "element_collection":
-            task_plan = [
+            return list(NEW_USER_INTRODUCTION_PLAN)
+        
+        if stage == "element_collection":
+            return [
                 {
                     "tool": "element_extraction_tool",
                     "params": {
@@ -145,9 +329,9 @@ class AgentCore:
                     "description": "提取投资要素"
                 }
             ]
-            
-        elif stage == "strategy_generation":
-            task_plan = [
+        
+        if stage == "strategy_generation":
+            return [
                 {
                     "tool": "element_extraction_tool",
                     "params": {
@@ -157,35 +341,11 @@ class AgentCore:
                     },
                     "description": "更新投资要素"
                 },
-                {
-                    "tool": "etf_data_fetch_tool",
-                    "params": {
-                        "asset_class": None,
-                        "limit": 20
-                    },
-                    "description": "获取ETF数据"
-                },
-                {
-                    "tool": "strategy_generation_tool",
-                    "params": {
-                        "investment_elements": {},  # 将从上一步结果中填充
-                        "constraints": {},
-                        "optimization_target": "sharpe_ratio"
-                    },
-                    "description": "生成投资策略"
-                },
-                {
-                    "tool": "strategy_backtest_tool",
-                    "params": {
-                        "strategy_config": {},  # 将从上一步结果中填充
-                        "backtest_period": 365
-                    },
-                    "description": "执行策略回测"
-                }
+                *STRATEGY_GENERATION_TASKS
             ]
-            
-        elif stage == "strategy_optimization":
-            task_plan = [
+        
+        if stage == "strategy_optimization":
+            return [
                 {
                     "tool": "element_extraction_tool",
                     "params": {
@@ -204,79 +364,111 @@ class AgentCore:
                     "description": "优化策略"
                 }
             ]
-            
-        elif stage == "market_recommendation":
-            task_plan = [
-                {
-                    "tool": "market_news_fetch_tool",
-                    "params": {
-                        "keywords": ["ETF", "投资机会"],
-                        "limit": 10
-                    },
-                    "description": "获取市场推荐资讯"
-                }
-            ]
         
-        return task_plan
+        if stage == "market_recommendation":
+            return list(MARKET_RECOMMENDATION_PLAN)
+        
+        return []
     
-    async def _execute_task_plan(self, task_plan: List[Dict[str, Any]], 
-                               execution_context: Dict[str, Any]) -> Dict[str, Any]:
-        """执行任务规划"""
+    async def _execute_task_plan(self, task_plan: List[Dict[str, Any]],
+                               execution_context: Dict[str, Any],
+                               tool_arun: Dict[str, Callable],
+                               status: StatusReporter) -> Dict[str, Any]:
+        """执行任务规划
+        
+        按参数依赖将任务划分为多个批次，同一批次内的任务互不依赖，并发执行。
+        """
         results = {}
+        # 工具名 -> 最近一次成功的结果，供后续任务解析参数依赖
+        producers: Dict[str, Dict[str, Any]] = {}
         
-        for i, task in enumerate(task_plan):
-            try:
+        for wave in self._build_execution_waves(task_plan):
+            wave_results = await asyncio.gather(
+                *(self._execute_task(task_plan[i], producers, tool_arun, status) for i in wave),
+                return_exceptions=True
+            )
+            
+            for i, result in zip(wave, wave_results):
+                task = task_plan[i]
                 tool_name = task["tool"]
-                tool_params = task["params"]
                 description = task["description"]
                 
-                await self._update_status("执行中", f"正在{description}")
-                
-                # 获取工具
-                tool = self.tools.get(tool_name)
-                if not tool:
-                    logger.warning(f"工具不存在: {tool_name}")
+                if isinstance(result, Exception):
+                    logger.error("任务执行失败 %s: %s", description, result)
+                    results[f"task_{i}_error"] = str(result)
                     continue
                 
-                # 处理参数依赖
-                tool_params = self._resolve_parameter_dependencies(tool_params, results)
+                # 工具不存在时跳过
+                if result is None:
+                    continue
                 
-                # 执行工具
-                result = await tool._arun(**tool_params)
                 results[f"task_{i}_{tool_name}"] = result
+                if isinstance(result, dict) and result.get("success"):
+                    producers[tool_name] = result
                 
                 # 处理特殊结果
                 if tool_name == "element_extraction_tool" and result.get("success"):
                     execution_context["extracted_elements"] = result["extracted_elements"]
                 
-                logger.info(f"任务完成: {description}")
-                
-            except Exception as e:
-                logger.error(f"任务执行失败 {task['description']}: {e}")
-                results[f"task_{i}_error"] = str(e)
+                logger.info("任务完成: %s", description)
         
         return results
     
+    async def _execute_task(self, task: Dict[str, Any],
+                          producers: Dict[str, Dict[str, Any]],
+                          tool_arun: Dict[str, Callable],
+                          status: StatusReporter) -> Optional[Dict[str, Any]]:
+        """执行单个任务，工具不存在时返回None"""
+        tool_name = task["tool"]
+        
+        status.update("执行中", f"正在{task['description']}")
+        
+        # 获取工具
+        arun = tool_arun.get(tool_name)
+        if arun is None:
+            logger.warning("工具不存在: %s", tool_name)
+            return None
+        
+        # 处理参数依赖
+        tool_params = self._resolve_parameter_dependencies(task["params"], producers)
+        
+        # 执行工具
+        return await arun(**tool_params)
+    
+    def _build_execution_waves(self, task_plan: List[Dict[str, Any]]) -> List[List[int]]:
+        """根据参数依赖构建执行批次（返回每批次的任务下标）"""
+        if not self.enable_parallel_tool_execution:
+            return [[i] for i in range(len(task_plan))]
+        
+        waves: List[List[int]] = []
+        producer_levels: Dict[str, int] = {}
+        
+        for i, task in enumerate(task_plan):
+            params = task["params"]
+            level = 0
+            
+            # 待填充的参数需要等待前序产出任务完成
+            for param_name, (producer, _) in PARAMETER_PRODUCERS.items():
+                if param_name in params and not params[param_name] and producer in producer_levels:
+                    level = max(level, producer_levels[producer] + 1)
+            
+            producer_levels[task["tool"]] = level
+            
+            if level == len(waves):
+                waves.append([])
+            waves[level].append(i)
+        
+        return waves
+    
     def _resolve_parameter_dependencies(self, params: Dict[str, Any], 
-                                      results: Dict[str, Any]) -> Dict[str, Any]:
-        """解析参数依赖"""
-        resolved_params = params.copy()
-        
-        # 处理策略生成工具的参数依赖
-        if "investment_elements" in resolved_params and not resolved_params["investment_elements"]:
-            # 从要素提取结果中获取
-            for key, result in results.items():
-                if "element_extraction_tool" in key and result.get("success"):
-                    resolved_params["investment_elements"] = result["extracted_elements"]
-                    break
-        
-        # 处理回测工具的参数依赖
-        if "strategy_config" in resolved_params and not resolved_params["strategy_config"]:
-            # 从策略生成结果中获取
-            for key, result in results.items():
-                if "strategy_generation_tool" in key and result.get("success"):
-                    resolved_params["strategy_config"] = result["strategy"]
-                    break
+                                      producers: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """解析参数依赖（仅在需要填充时复制参数）"""
+        resolved_params = params
+        
+        # 投资要素来自要素提取结果，策略配置来自策略生成结果
+        for param_name, (producer, result_key) in PARAMETER_PRODUCERS.items():
+            if param_name in params and not params[param_name] and producer in producers:
+                resolved_params = {**resolved_params, param_name: producers[producer][result_key]}
         
         return resolved_params
     
@@ -287,18 +479,27 @@ class AgentCore:
             # 构建回复生成提示词
             prompt = self._build_response_prompt(execution_result, stage, user_message)
             
-            # 调用LLM生成回复
-            response = self.llm(prompt)
+            # 调用LLM生成回复（不阻塞事件循环）
+            if hasattr(self.llm, "ainvoke"):
+                response = await self.llm.ainvoke(prompt)
+            else:
+                response = await asyncio.to_thread(self.llm, prompt)
             
             return response.strip()
             
         except Exception as e:
-            logger.error(f"生成最终回复失败: {e}")
+            logger.error("生成最终回复失败: %s", e)
             return self._generate_fallback_response(stage)
     
     def _build_response_prompt(self, execution_result: Dict[str, Any],
                              stage: str, user_message: str) -> str:
         """构建回复生成提示词"""
+        # 结果键格式为 task_{i}_{tool_name}，按工具压缩后再写入提示词
+        prompt_result = {
+            key: self._summarize_for_prompt(value, key.split("_", 2)[-1])
+            for key, value in execution_result.items()
+        }
+        
         prompt = f"""
 你是一个专业的ETF投资顾问助手，正在与用户进行投资策略咨询。
 
@@ -306,7 +507,7 @@ class AgentCore:
 用户消息：{user_message}
 
 执行结果：
-{json.dumps(execution_result, ensure_ascii=False, indent=2)}
+{self._serialize_execution_result(prompt_result)}
 
 请根据执行结果生成一个专业、友好、有用的回复。回复应该：
 1. 直接回应用户的问题或需求
@@ -318,43 +519,116 @@ class AgentCore:
 """
         return prompt
     
-    def _generate_fallback_response(self, stage: str) -> str:
-        """生成备用回复"""
-        fallback_responses = {
-            "new_user_introduction": "欢迎使用ETF资产配置策略系统！我可以帮助您制定个性化的ETF投资策略。请告诉我您的投资偏好和目标。",
-            "element_collection": "我正在了解您的投资需求。请继续告诉我您的风险偏好、目标收益率等信息。",
-            "strategy_generation": "我正在为您生成投资策略，请稍等片刻。",
-            "strategy_optimization": "我会根据您的反馈来优化策略配置。",
-            "market_recommendation": "让我为您推荐一些当前市场上的投资机会。"
-        }
+    @staticmethod
+    def _summarize_for_prompt(result: Any, tool_name: str) -> Any:
+        """压缩工具结果，只保留生成回复所需的关键信息"""
+        if not isinstance(result, dict):
+            return result
+        
+        if tool_name == "strategy_backtest_tool":
+            backtest_results = result.get("backtest_results") or {}
+            return {
+                "success": result.get("success"),
+                "performance_metrics": result.get("performance_metrics"),
+                "backtest_period": result.get("backtest_period"),
+                "start_date": backtest_results.get("start_date"),
+                "end_date": backtest_results.get("end_date")
+            }
+        
+        if tool_name == "etf_data_fetch_tool":
+            etf_data = result.get("etf_data") or []
+            return {
+                **result,
+                "etf_data": [
+                    {
+                        "etf_code": etf.get("etf_code"),
+                        "etf_name": etf.get("etf_name"),
+                        "asset_class": etf.get("asset_class")
+                    }
+                    for etf in etf_data[:PROMPT_TOP_N]
+                ]
+            }
+        
+        if tool_name == "market_news_fetch_tool":
+            news_data = result.get("news_data") or []
+            return {
+                **result,
+                "news_data": [
+                    {
+                        "title": news.get("title"),
+                        "summary": news.get("summary"),
+                        "publish_time": news.get("publish_time")
+                    }
+                    for news in news_data[:PROMPT_TOP_N]
+                ]
+            }
         
-        return fallback_responses.get(stage, "感谢您的咨询，我会尽力为您提供专业的投资建议。")
+        return result
+    
+    @staticmethod
+    def _serialize_execution_result(execution_result: Dict[str, Any]) -> str:
+        """序列化执行结果（orjson输出UTF-8，中文不转义）"""
+        return orjson.dumps(
+            execution_result,
+            default=str,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode("utf-8")
+    
+    @staticmethod
+    def _generate_fallback_response(stage: str) -> str:
+        """生成备用回复"""
+        return FALLBACK_RESPONSES.get(stage, DEFAULT_FALLBACK_RESPONSE)
     
     async def _get_conversation_context(self, session_id: str) -> Dict[str, Any]:
         """获取对话上下文"""
         try:
+            # 等待该会话上一轮的上下文写入完成，保证读到最新上下文
+            await self.wait_context_write(session_id)
+            
             context = await self.cache_service.get_conversation_context(session_id)
             return context or {}
         except Exception as e:
-            logger.error(f"获取对话上下文失败: {e}")
+            logger.error("获取对话上下文失败: %s", e)
             return {}
     
-    async def _update_conversation_context(self, session_id: str, 
-                                         context_update: Dict[str, Any]):
-        """更新对话上下文"""
-        try:
-            await self.cache_service.update_conversation_context(session_id, context_update)
-        except Exception as e:
-            logger.error(f"更新对话上下文失败: {e}")
+    async def wait_context_write(self, session_id: str):
+        """等待该会话未完成的上下文写入
+        
+        调用方在process_conversation之后自行写入上下文时需先等待，
+        保证调用方的写入在后台写入之后落地。
+        """
+        pending_write = self._context_write_tasks.get(session_id)
+        if pending_write:
+            await pending_write
     
-    async def _update_status(self, status: str, message: str):
-        """更新处理状态"""
+    def _update_conversation_context(self, session_id: str, context_update: Dict[str, Any]):
+        """更新对话上下文
+        
+        后台只写入本轮变化的字段，不阻塞回复。
+        """
         try:
-            if self.status_callback:
-                await self.status_callback({
-                    "status": status,
-                    "message": message,
-                    "timestamp": asyncio.get_event_loop().time()
-                })
+            task = asyncio.create_task(
+                self.cache_service.update_conversation_context(session_id, context_update)
+            )
+            self._context_write_tasks[session_id] = task
+            
+            def forget_write(done: asyncio.Task):
+                # 写入完成后移除记录（期间已有新的写入则保留新任务）
+                if self._context_write_tasks.get(session_id) is done:
+                    del self._context_write_tasks[session_id]
+            
+            task.add_done_callback(forget_write)
         except Exception as e:
-            logger.error(f"状态更新失败: {e}")
+            logger.error("更新对话上下文失败: %s", e)
+
+
+# LLM对象ID -> 共享的智能体实例（智能体持有LLM引用，缓存期间ID不会被复用）
+_agent_cores: Dict[int, AgentCore] = {}
+
+
+def get_agent_core(llm: LLM) -> AgentCore:
+    """获取使用指定LLM的共享智能体实例（每个LLM只创建一次）"""
+    agent_core = _agent_cores.get(id(llm))
+    if agent_core is None:
+        agent_core = _agent_cores[id(llm)] = AgentCore(llm)
+    return agent_core
@@ -1,66 +1,105 @@
 """业务流程管理器"""
+from types import MappingProxyType
 from typing import Dict, Any, Optional
+import ahocorasick
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# 业务流程阶段配置（只读，所有实例共享）
+FLOW_STAGES = MappingProxyType({
+    "new_user_introduction": {
+        "description": "新用户介绍阶段",
+        "triggers": ("新用户", "首次使用", "介绍"),
+        "next_stages": ("element_collection", "market_recommendation")
+    },
+    "old_user_welcome": {
+        "description": "老用户欢迎阶段", 
+        "triggers": ("老用户", "历史策略", "欢迎回来"),
+        "next_stages": ("strategy_review", "market_recommendation", "strategy_optimization")
+    },
+    "element_collection": {
+        "description": "投资要素收集阶段",
+        "triggers": ("投资偏好", "风险", "收益", "资金", "期限"),
+        "next_stages": ("strategy_generation", "element_collection")
+    },
+    "strategy_generation": {
+        "description": "策略生成阶段",
+        "triggers": ("生成策略", "制定方案", "投资建议"),
+        "next_stages": ("strategy_presentation", "strategy_optimization")
+    },
+    "strategy_presentation": {
+        "description": "策略展示阶段",
+        "triggers": ("查看策略", "展示方案", "策略详情"),
+        "next_stages": ("strategy_optimization", "strategy_save", "element_collection")
+    },
+    "strategy_optimization": {
+        "description": "策略优化阶段",
+        "triggers": ("修改", "调整", "优化", "不满意", "改进"),
+        "next_stages": ("strategy_presentation", "strategy_save", "element_collection")
+    },
+    "strategy_review": {
+        "description": "策略回顾阶段",
+        "triggers": ("历史策略", "之前的", "回顾", "查看"),
+        "next_stages": ("strategy_optimization", "market_recommendation", "strategy_generation")
+    },
+    "market_recommendation": {
+        "description": "市场推荐阶段",
+        "triggers": ("推荐", "热点", "机会", "资讯", "新闻"),
+        "next_stages": ("element_collection", "strategy_generation", "strategy_optimization")
+    },
+    "strategy_save": {
+        "description": "策略保存阶段",
+        "triggers": ("保存", "确认", "采用", "使用这个策略"),
+        "next_stages": ("conversation_end", "market_recommendation")
+    },
+    "conversation_end": {
+        "description": "对话结束阶段",
+        "triggers": ("谢谢", "再见", "结束", "满意"),
+        "next_stages": ()
+    }
+})
+
+# 各阶段允许转换到的下一阶段集合
+NEXT_STAGES = {stage: frozenset(config["next_stages"]) for stage, config in FLOW_STAGES.items()}
+
+_EMPTY_STAGES: frozenset = frozenset()
+
+# 各阶段的小写触发词，避免在请求路径上重复转换
+LOWER_TRIGGERS_BY_STAGE = {
+    stage: tuple(trigger.lower() for trigger in config["triggers"])
+    for stage, config in FLOW_STAGES.items()
+}
+
+# 各阶段描述
+STAGE_DESCRIPTIONS = {stage: config["description"] for stage, config in FLOW_STAGES.items()}
+
+
+def _build_trigger_automaton() -> "ahocorasick.Automaton":
+    """构建触发词自动机（小写触发词 -> 所属阶段）"""
+    trigger_stages: Dict[str, list] = {}
+    for stage, triggers in LOWER_TRIGGERS_BY_STAGE.items():
+        for trigger in triggers:
+            trigger_stages.setdefault(trigger, []).append(stage)
+    
+    automaton = ahocorasick.Automaton()
+    for trigger, stages in trigger_stages.items():
+        automaton.add_word(trigger, (trigger, tuple(stages)))
+    automaton.make_automaton()
+    return automaton
+
+
+# 触发词自动机，配置只读因此只需构建一次
+TRIGGER_AUTOMATON = _build_trigger_automaton()
+
+
 class BusinessFlowManager:
     """业务流程管理器"""
     
-    def __init__(self):
-        self.flow_stages = {
-            "new_user_introduction": {
-                "description": "新用户介绍阶段",
-                "triggers": ["新用户", "首次使用", "介绍"],
-                "next_stages": ["element_collection", "market_recommendation"]
-            },
-            "old_user_welcome": {
-                "description": "老用户欢迎阶段", 
-                "triggers": ["老用户", "历史策略", "欢迎回来"],
-                "next_stages": ["strategy_review", "market_recommendation", "strategy_optimization"]
-            },
-            "element_collection": {
-                "description": "投资要素收集阶段",
-                "triggers": ["投资偏好", "风险", "收益", "资金", "期限"],
-                "next_stages": ["strategy_generation", "element_collection"]
-            },
-            "strategy_generation": {
-                "description": "策略生成阶段",
-                "triggers": ["生成策略", "制定方案", "投资建议"],
-                "next_stages": ["strategy_presentation", "strategy_optimization"]
-            },
-            "strategy_presentation": {
-                "description": "策略展示阶段",
-                "triggers": ["查看策略", "展示方案", "策略详情"],
-                "next_stages": ["strategy_optimization", "strategy_save", "element_collection"]
-            },
-            "strategy_optimization": {
-                "description": "策略优化阶段",
-                "triggers": ["修改", "调整", "优化", "不满意", "改进"],
-                "next_stages": ["strategy_presentation", "strategy_save", "element_collection"]
-            },
-            "strategy_review": {
-                "description": "策略回顾阶段",
-                "triggers": ["历史策略", "之前的", "回顾", "查看"],
-                "next_stages": ["strategy_optimization", "market_recommendation", "strategy_generation"]
-            },
-            "market_recommendation": {
-                "description": "市场推荐阶段",
-                "triggers": ["推荐", "热点", "机会", "资讯", "新闻"],
-                "next_stages": ["element_collection", "strategy_generation", "strategy_optimization"]
-            },
-            "strategy_save": {
-                "description": "策略保存阶段",
-                "triggers": ["保存", "确认", "采用", "使用这个策略"],
-                "next_stages": ["conversation_end", "market_recommendation"]
-            },
-            "conversation_end": {
-                "description": "对话结束阶段",
-                "triggers": ["谢谢", "再见", "结束", "满意"],
-                "next_stages": []
-            }
-        }
+    __slots__ = ()
+    
+    flow_stages = FLOW_STAGES
     
     def determine_stage(self, user_info: Dict[str, Any], 
                        context: Dict[str, Any], 
@@ -87,18 +126,28 @@ class BusinessFlowManager:
             # 2. 基于消息内容的阶段判断
             stage_scores = {}
             
-            for stage, config in self.flow_stages.items():
-                score = 0
-                triggers = config.get("triggers", [])
-                
-                for trigger in triggers:
-                    if trigger.lower() in message_lower:
-                        score += 1
-                
-                if score > 0:
-                    stage_scores[stage] = score
+            # 单次扫描消息匹配全部触发词，每个触发词只计一次分
+            matched_triggers = set()
+            for _, (trigger, stages) in TRIGGER_AUTOMATON.iter(message_lower):
+                if trigger in matched_triggers:
+                    continue
+                matched_triggers.add(trigger)
+                for stage in stages:
+                    stage_scores[stage] = stage_scores.get(stage, 0) + 1
             
-            # 3. 选择得分最高的阶段
+            # 3. 命中当前阶段的触发词，且得分不低于可转换的其他阶段时，继续停留在当前阶段
+            current_score = stage_scores.get(last_stage, 0)
+            if current_score:
+                next_stages = NEXT_STAGES.get(last_stage, _EMPTY_STAGES)
+                competing_score = max(
+                    (score for stage, score in stage_scores.items()
+                     if stage != last_stage and stage in next_stages),
+                    default=0
+                )
+                if current_score >= competing_score:
+                    return last_stage
+            
+            # 4. 选择得分最高的阶段
             if stage_scores:
                 best_stage = max(stage_scores, key=stage_scores.get)
                 
@@ -106,11 +155,11 @@ class BusinessFlowManager:
                 if self._is_valid_transition(last_stage, best_stage):
                     return best_stage
             
-            # 4. 基于上下文的默认流程
+            # 5. 基于上下文的默认流程
             return self._get_default_next_stage(last_stage, context, user_info)
             
         except Exception as e:
-            logger.error(f"判断业务流程阶段失败: {e}")
+            logger.error("判断业务流程阶段失败: %s", e)
             return "element_collection"  # 默认阶段
     
     def _is_valid_transition(self, from_stage: Optional[str], to_stage: str) -> bool:
@@ -118,11 +167,8 @@ class BusinessFlowManager:
         if not from_stage:
             return True
         
-        stage_config = self.flow_stages.get(from_stage, {})
-        next_stages = stage_config.get("next_stages", [])
-        
         # 允许转换到指定的下一阶段，或者相同阶段（重复处理）
-        return to_stage in next_stages or to_stage == from_stage
+        return to_stage in NEXT_STAGES.get(from_stage, _EMPTY_STAGES) or to_stage == from_stage
     
     def _get_default_next_stage(self, current_stage: Optional[str], 
                                context: Dict[str, Any],
@@ -160,15 +206,15 @@ class BusinessFlowManager:
         else:
             return "element_collection"
     
-    def get_stage_description(self, stage: str) -> str:
+    @staticmethod
+    def get_stage_description(stage: str) -> str:
         """获取阶段描述"""
-        stage_config = self.flow_stages.get(stage, {})
-        return stage_config.get("description", "未知阶段")
+        return STAGE_DESCRIPTIONS.get(stage, "未知阶段")
     
     def get_next_stages(self, current_stage: str) -> list:
         """获取可能的下一阶段"""
         stage_config = self.flow_stages.get(current_stage, {})
-        return stage_config.get("next_stages", [])
+        return list(stage_config.get("next_stages", ()))
     
     def get_stage_progress(self, stage: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """获取阶段进度"""
@@ -207,3 +253,7 @@ class BusinessFlowManager:
             progress["next_suggested_actions"] = ["确认优化结果", "继续调整", "保存策略"]
         
         return progress
+
+
+# 创建全局业务流程管理器实例
+business_flow_manager = BusinessFlowManager()
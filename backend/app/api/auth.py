@@ -14,14 +14,14 @@ router = APIRouter(prefix="/api/auth", tags=["认证"])
 async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """用户注册"""
     auth_service = AuthService(db)
-    return auth_service.register_user(user_data)
+    return await auth_service.register_user(user_data)
 
 
 @router.post("/login", response_model=Token, summary="用户登录")
 async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """用户登录"""
     auth_service = AuthService(db)
-    return auth_service.authenticate_user(user_data)
+    return await auth_service.authenticate_user(user_data)
 
 
 @router.post("/logout", summary="用户登出")
@@ -55,7 +55,7 @@ async def change_password(
 ):
     """修改密码"""
     auth_service = AuthService(db)
-    success = auth_service.change_password(current_user.id, password_data)
+    success = await auth_service.change_password(current_user.id, password_data)
     
     if success:
         return {"success": True, "message": "密码修改成功"}
@@ -1,17 +1,24 @@
 """对话API路由"""
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Dict, Any, List
-from app.core.database import get_db
-from app.core.dependencies import get_current_user
+from app.core.database import get_db, get_async_db
+from app.core.dependencies import get_current_user_async
 from app.models.user import User
-from app.models.conversation import Conversation
-from app.conversation.service import ConversationService
+from app.models.conversation import Conversation, ConversationSession
+from app.models.strategy import Strategy
+from app.conversation.service import (
+    ConversationService, WELCOME_NEW_USER, WELCOME_RETURNING_USER_TEMPLATE
+)
+from app.conversation.schemas import conversation_history_adapter
 from app.conversation.websocket_manager import websocket_manager
-from app.agent.agent_core import AgentCore
+from app.conversation.writer import conversation_writer
+from app.agent.agent_core import get_agent_core
 from langchain.llms.base import LLM
 from app.utils.helpers import generate_session_id
-import json
+import orjson
 # 移除uuid依赖，使用helpers中的ID生成函数
 import logging
 
@@ -19,27 +26,11 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/conversation", tags=["对话"])
 
-# WebSocket连接管理器
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, session_id: str):
-        await websocket.accept()
-        self.active_connections[session_id] = websocket
-    
-    def disconnect(self, session_id: str):
-        if session_id in self.active_connections:
-            del self.active_connections[session_id]
-    
-    async def send_message(self, session_id: str, message: dict):
-        if session_id in self.active_connections:
-            try:
-                await self.active_connections[session_id].send_text(json.dumps(message, ensure_ascii=False))
-            except Exception as e:
-                logger.error(f"发送消息失败: {e}")
+# 对话历史流式输出时每批读取的记录数
+HISTORY_STREAM_BATCH_SIZE = 500
 
-manager = ConnectionManager()
+# 对话历史接口不返回提取的投资要素，与原有响应字段保持一致
+HISTORY_EXCLUDE_FIELDS = {"__all__": {"extracted_elements"}}
 
 # 模拟LLM（实际使用时需要配置真实的LLM）
 class MockLLM(LLM):
@@ -51,48 +42,36 @@ class MockLLM(LLM):
         return "mock"
 
 
+# 创建全局LLM和智能体实例（各连接共享，数据库会话和状态回调按调用传入）
+mock_llm = MockLLM()
+agent_core = get_agent_core(mock_llm)
+
+
 @router.post("/start", summary="开始对话")
 async def start_conversation(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """开始新的对话会话"""
     try:
         # 生成会话ID
         session_id = generate_session_id()
         
-        # 判断用户类型
-        is_new_user = len(current_user.strategies) == 0
+        # 获取用户目标收益最高的策略（单行单列，无策略即为新用户）
+        best_strategy_name = await db.scalar(
+            select(Strategy.name)
+            .where(Strategy.user_id == current_user.id)
+            .order_by(func.coalesce(Strategy.target_return, 0).desc(), Strategy.id)
+            .limit(1)
+        )
+        is_new_user = best_strategy_name is None
         
         # 生成欢迎消息
         if is_new_user:
-            welcome_message = (
-                "欢迎使用ETF资产配置策略系统！我是您的专属投资顾问助手。\n\n"
-                "ETF资产配置策略可以帮助您：\n"
-                "• 通过分散投资降低风险\n"
-                "• 获得稳健的长期收益\n" 
-                "• 实现动态再平衡\n\n"
-                "让我们开始了解您的投资需求吧！请告诉我您的风险偏好和投资目标。"
-            )
+            welcome_message = WELCOME_NEW_USER
         else:
-            # 获取用户最好的策略
-            best_strategy = None
-            if current_user.strategies:
-                best_strategy = max(current_user.strategies, 
-                                  key=lambda s: s.target_return or 0)
-            
-            strategy_info = ""
-            if best_strategy:
-                strategy_info = f"您的'{best_strategy.name}'策略表现不错，"
-            
-            welcome_message = (
-                f"欢迎回来！{strategy_info}让我为您提供最新的投资建议。\n\n"
-                "我可以帮您：\n"
-                "• 查看和优化现有策略\n"
-                "• 获取最新市场资讯\n"
-                "• 制定新的投资策略\n\n"
-                "请告诉我您想要做什么？"
-            )
+            strategy_info = f"您的'{best_strategy_name}'策略表现不错，"
+            welcome_message = WELCOME_RETURNING_USER_TEMPLATE.format(strategy_info=strategy_info)
         
         return {
             "session_id": session_id,
@@ -112,68 +91,69 @@ async def websocket_endpoint(
     db: Session = Depends(get_db)
 ):
     """WebSocket对话连接"""
-    await manager.connect(websocket, session_id)
+    await websocket_manager.connect(websocket, session_id)
     
-    # 初始化智能体（实际使用时需要配置真实的LLM）
-    mock_llm = MockLLM()
-    agent = AgentCore(db, mock_llm)
+    # 依赖数据库会话的工具在连接建立时绑定一次，连接内的消息复用
+    tool_arun = agent_core.bind_tools(db)
     
-    # 设置状态更新回调
+    # 本连接的状态更新回调
     async def status_callback(status_data):
-        await manager.send_message(session_id, {
+        await websocket_manager.send_to_session(session_id, {
             "type": "status_update",
             "data": status_data
         })
     
-    agent.set_status_callback(status_callback)
-    
     try:
         while True:
-            # 接收消息
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            # 接收消息（同时接受文本帧和二进制帧，orjson可直接解析bytes）
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            message_data = orjson.loads(frame.get("bytes") or frame.get("text") or b"{}")
             
             user_id = message_data.get("user_id")
             message = message_data.get("message", "")
             
             if not user_id or not message:
-                await manager.send_message(session_id, {
+                await websocket_manager.send_to_session(session_id, {
                     "type": "error",
                     "data": {"message": "缺少必要参数"}
                 })
                 continue
             
-            # 保存用户消息到数据库
-            user_conversation = Conversation(
-                user_id=user_id,
-                session_id=session_id,
-                message_type="user",
-                content=message,
+            websocket_manager.bind_user(session_id, user_id)
+            
+            # 保存用户消息（后台批量写入，不阻塞回复）
+            conversation_writer.enqueue(
+                user_id,
+                session_id,
+                "user",
+                message,
                 round_number=1  # 实际应用中需要计算轮次
             )
-            db.add(user_conversation)
-            db.commit()
             
             # 处理对话
-            result = await agent.process_conversation(user_id, session_id, message)
+            result = await agent_core.process_conversation(
+                user_id, session_id, message, db,
+                status_callback=status_callback,
+                tool_arun=tool_arun
+            )
             
             if result["success"]:
                 response_message = result["response"]
                 
-                # 保存助手回复到数据库
-                assistant_conversation = Conversation(
-                    user_id=user_id,
-                    session_id=session_id,
-                    message_type="assistant",
-                    content=response_message,
+                # 保存助手回复
+                conversation_writer.enqueue(
+                    user_id,
+                    session_id,
+                    "assistant",
+                    response_message,
                     round_number=1,
                     context_data=result.get("execution_result")
                 )
-                db.add(assistant_conversation)
-                db.commit()
                 
                 # 发送回复
-                await manager.send_message(session_id, {
+                await websocket_manager.send_to_session(session_id, {
                     "type": "message",
                     "data": {
                         "message": response_message,
@@ -182,85 +162,91 @@ async def websocket_endpoint(
                     }
                 })
             else:
-                await manager.send_message(session_id, {
+                await websocket_manager.send_to_session(session_id, {
                     "type": "error", 
                     "data": {"message": result.get("error", "处理失败")}
                 })
     
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
+        await websocket_manager.disconnect(session_id, websocket)
         logger.info(f"WebSocket连接断开: {session_id}")
     except Exception as e:
         logger.error(f"WebSocket处理错误: {e}")
-        manager.disconnect(session_id)
+        await websocket_manager.disconnect(session_id, websocket)
 
 
 @router.get("/history/{session_id}", summary="获取对话历史")
 async def get_conversation_history(
     session_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取对话历史"""
+    """获取对话历史（服务端游标分批读取并流式输出）"""
     try:
-        conversations = db.query(Conversation).filter(
-            Conversation.session_id == session_id,
-            Conversation.user_id == current_user.id
-        ).order_by(Conversation.created_at).all()
-        
-        history = []
-        for conv in conversations:
-            history.append({
-                "id": conv.id,
-                "message_type": conv.message_type,
-                "content": conv.content,
-                "round_number": conv.round_number,
-                "created_at": conv.created_at.isoformat(),
-                "context_data": conv.context_data
-            })
-        
-        return {"conversations": history}
+        result = await db.stream_scalars(
+            select(Conversation)
+            .where(
+                Conversation.session_id == session_id,
+                Conversation.user_id == current_user.id
+            )
+            # 同一批次写入的消息时间可能相同，按ID保持写入顺序
+            .order_by(Conversation.created_at, Conversation.id)
+            .execution_options(yield_per=HISTORY_STREAM_BATCH_SIZE)
+        )
+        batches = result.partitions(HISTORY_STREAM_BATCH_SIZE)
         
+        # 先取第一批，查询失败时仍可返回500
+        first_batch = await anext(batches, [])
     except Exception as e:
         logger.error(f"获取对话历史失败: {e}")
         raise HTTPException(status_code=500, detail="获取对话历史失败")
+    
+    async def stream_history():
+        yield b'{"conversations":['
+        batch = first_batch
+        separator = b""
+        while batch:
+            # 校验与JSON编码均在pydantic-core中完成，去掉列表括号后拼接各批次
+            payload = conversation_history_adapter.dump_json(
+                conversation_history_adapter.validate_python(batch),
+                exclude=HISTORY_EXCLUDE_FIELDS
+            )
+            yield separator + payload[1:-1]
+            separator = b","
+            batch = await anext(batches, [])
+        yield b"]}"
+    
+    return StreamingResponse(stream_history(), media_type="application/json")
 
 
 @router.get("/sessions", summary="获取用户对话会话列表")
 async def get_user_sessions(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取用户的对话会话列表"""
     try:
-        # 获取用户的所有会话
-        sessions = db.query(Conversation.session_id).filter(
-            Conversation.user_id == current_user.id
-        ).distinct().all()
-        
-        session_list = []
-        for session in sessions:
-            session_id = session[0]
-            
-            # 获取会话的最后一条消息
-            last_message = db.query(Conversation).filter(
-                Conversation.session_id == session_id,
-                Conversation.user_id == current_user.id
-            ).order_by(Conversation.created_at.desc()).first()
-            
-            if last_message:
-                session_list.append({
-                    "session_id": session_id,
-                    "last_message": last_message.content[:50] + "..." if len(last_message.content) > 50 else last_message.content,
-                    "last_message_time": last_message.created_at.isoformat(),
-                    "message_count": db.query(Conversation).filter(
-                        Conversation.session_id == session_id,
-                        Conversation.user_id == current_user.id
-                    ).count()
-                })
+        # 直接读取会话汇总表的所需列，无需对对话记录做聚合（消息预览在写入时已截取）
+        rows = (await db.execute(
+            select(
+                ConversationSession.session_id,
+                ConversationSession.last_message_preview,
+                ConversationSession.last_message_time,
+                ConversationSession.message_count
+            )
+            .where(ConversationSession.user_id == current_user.id)
+            .order_by(ConversationSession.last_message_time.desc())
+        )).all()
         
-        # 按最后消息时间排序
-        session_list.sort(key=lambda x: x["last_message_time"], reverse=True)
+        session_list = [
+            {
+                "session_id": session_id,
+                "last_message": preview or "",
+                "last_message_time": last_time.isoformat(),
+                "message_count": message_count
+            }
+            for session_id, preview, last_time, message_count in rows
+        ]
         
         return {"sessions": session_list}
         
@@ -1,12 +1,16 @@
 """策略API路由"""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from app.core.database import get_db
-from app.core.dependencies import get_current_user
+from datetime import datetime
+from app.core.database import get_async_db
+from app.core.dependencies import get_current_user_async
 from app.models.user import User
 from app.models.strategy import Strategy, StrategyETFAllocation
-from pydantic import BaseModel
+from app.cache.service import cache_service
+from pydantic import BaseModel, Field, TypeAdapter, computed_field
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +18,18 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/strategy", tags=["策略"])
 
 
+class ETFAllocationItem(BaseModel):
+    """策略ETF配置项模型"""
+    etf_code: str
+    etf_name: str
+    allocation_percentage: float
+    asset_class: Optional[str]
+    sector: Optional[str]
+    
+    class Config:
+        from_attributes = True
+
+
 class StrategyResponse(BaseModel):
     """策略响应模型"""
     id: int
@@ -25,14 +41,43 @@ class StrategyResponse(BaseModel):
     risk_level: Optional[str]
     investment_amount: Optional[float]
     status: str
-    created_at: str
-    updated_at: str
-    etf_allocations: List[dict]
+    created_at: datetime
+    updated_at: datetime
+    etf_allocations: List[ETFAllocationItem]
+    
+    class Config:
+        from_attributes = True
+
+
+class StrategyHistoryItem(BaseModel):
+    """策略历史项模型"""
+    id: int
+    name: str
+    description: Optional[str]
+    risk_level: Optional[str]
+    target_return: Optional[float]
+    max_drawdown: Optional[float] = Field(None, exclude=True)
+    investment_amount: Optional[float]
+    created_at: datetime
+    updated_at: datetime
+    
+    @computed_field
+    @property
+    def performance(self) -> dict:
+        """简单的绩效指标（实际应用中需要真实的回测数据）"""
+        return {
+            "annual_return": self.target_return or 0,
+            "max_drawdown": self.max_drawdown or 0
+        }
     
     class Config:
         from_attributes = True
 
 
+# 批量校验ORM对象列表
+strategy_history_adapter = TypeAdapter(List[StrategyHistoryItem])
+
+
 class StrategySaveRequest(BaseModel):
     """策略保存请求模型"""
     strategy_id: Optional[int] = None
@@ -52,50 +97,26 @@ class StrategySaveRequest(BaseModel):
 @router.get("/{strategy_id}", response_model=StrategyResponse, summary="获取策略详情")
 async def get_strategy_detail(
     strategy_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取策略详情"""
     try:
-        strategy = db.query(Strategy).filter(
-            Strategy.id == strategy_id,
-            Strategy.user_id == current_user.id
-        ).first()
+        # 异步会话不支持延迟加载，ETF配置随查询一并加载
+        strategy = await db.scalar(
+            select(Strategy)
+            .options(selectinload(Strategy.etf_allocations))
+            .where(
+                Strategy.id == strategy_id,
+                Strategy.user_id == current_user.id
+            )
+        )
         
         if not strategy:
             raise HTTPException(status_code=404, detail="策略不存在")
         
-        # 获取ETF配置
-        etf_allocations = db.query(StrategyETFAllocation).filter(
-            StrategyETFAllocation.strategy_id == strategy_id
-        ).all()
-        
-        etf_list = []
-        for allocation in etf_allocations:
-            etf_list.append({
-                "etf_code": allocation.etf_code,
-                "etf_name": allocation.etf_name,
-                "allocation_percentage": allocation.allocation_percentage,
-                "asset_class": allocation.asset_class,
-                "sector": allocation.sector
-            })
-        
-        strategy_data = {
-            "id": strategy.id,
-            "name": strategy.name,
-            "description": strategy.description,
-            "investment_philosophy": strategy.investment_philosophy,
-            "target_return": strategy.target_return,
-            "max_drawdown": strategy.max_drawdown,
-            "risk_level": strategy.risk_level,
-            "investment_amount": strategy.investment_amount,
-            "status": strategy.status,
-            "created_at": strategy.created_at.isoformat(),
-            "updated_at": strategy.updated_at.isoformat(),
-            "etf_allocations": etf_list
-        }
-        
-        return strategy_data
+        # 直接从ORM对象（含ETF配置关联）构建响应模型
+        return StrategyResponse.model_validate(strategy)
         
     except HTTPException:
         raise
@@ -107,17 +128,19 @@ async def get_strategy_detail(
 @router.post("/save", summary="保存策略")
 async def save_strategy(
     strategy_data: StrategySaveRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """保存策略"""
     try:
         if strategy_data.strategy_id:
             # 更新现有策略
-            strategy = db.query(Strategy).filter(
-                Strategy.id == strategy_data.strategy_id,
-                Strategy.user_id == current_user.id
-            ).first()
+            strategy = await db.scalar(
+                select(Strategy).where(
+                    Strategy.id == strategy_data.strategy_id,
+                    Strategy.user_id == current_user.id
+                )
+            )
             
             if not strategy:
                 raise HTTPException(status_code=404, detail="策略不存在")
@@ -139,33 +162,53 @@ async def save_strategy(
         strategy.preferences = strategy_data.preferences
         strategy.status = "active"
         
-        db.commit()
-        db.refresh(strategy)
+        # 先flush获取策略ID，与ETF配置在同一事务中提交
+        await db.flush()
         
         # 删除现有的ETF配置
         if strategy_data.strategy_id:
-            db.query(StrategyETFAllocation).filter(
-                StrategyETFAllocation.strategy_id == strategy.id
-            ).delete()
+            await db.execute(
+                delete(StrategyETFAllocation)
+                .where(StrategyETFAllocation.strategy_id == strategy.id)
+                .execution_options(synchronize_session=False)
+            )
+        
+        # 批量添加新的ETF配置
+        allocation_rows = [
+            {
+                "strategy_id": strategy.id,
+                "etf_code": allocation_data["etf_code"],
+                "etf_name": allocation_data["etf_name"],
+                "allocation_percentage": allocation_data["weight"],
+                "asset_class": allocation_data.get("asset_class"),
+                "sector": allocation_data.get("sector")
+            }
+            for allocation_data in strategy_data.etf_allocations
+        ]
+        if allocation_rows:
+            await db.execute(insert(StrategyETFAllocation), allocation_rows)
         
-        # 添加新的ETF配置
-        for allocation_data in strategy_data.etf_allocations:
-            allocation = StrategyETFAllocation(
-                strategy_id=strategy.id,
-                etf_code=allocation_data["etf_code"],
-                etf_name=allocation_data["etf_name"],
-                allocation_percentage=allocation_data["weight"],
-                asset_class=allocation_data.get("asset_class"),
-                sector=allocation_data.get("sector")
+        # 更新用户的策略数量和类型，与策略在同一事务中提交
+        if not strategy_data.strategy_id:
+            await db.execute(
+                update(User)
+                .where(User.id == current_user.id)
+                .values(strategy_count=User.strategy_count + 1, is_new_user=False)
+                .execution_options(synchronize_session=False)
+            )
+        elif current_user.is_new_user:
+            # 老用户不发语句；条件更新只写仍为新用户的行
+            await db.execute(
+                update(User)
+                .where(User.id == current_user.id, User.is_new_user == True)  # noqa: E712
+                .values(is_new_user=False)
+                .execution_options(synchronize_session=False)
             )
-            db.add(allocation)
         
-        db.commit()
+        await db.commit()
         
-        # 更新用户类型（标记为老用户）
-        if current_user.is_new_user:
-            current_user.is_new_user = False
-            db.commit()
+        # 策略变化会影响用户身份识别结果
+        await cache_service.delete_user_identity(current_user.id)
         
         return {
             "success": True,
@@ -177,44 +220,31 @@ async def save_strategy(
         raise
     except Exception as e:
         logger.error(f"保存策略失败: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="保存策略失败")
 
 
 @router.get("/history", summary="获取策略历史")
 async def get_strategy_history(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取用户的策略历史"""
     try:
-        strategies = db.query(Strategy).filter(
-            Strategy.user_id == current_user.id,
-            Strategy.status == "active"
-        ).order_by(Strategy.updated_at.desc()).all()
-        
-        strategy_list = []
-        for strategy in strategies:
-            # 计算简单的绩效指标（实际应用中需要真实的回测数据）
-            performance = {
-                "annual_return": strategy.target_return or 0,
-                "max_drawdown": strategy.max_drawdown or 0
-            }
-            
-            strategy_info = {
-                "id": strategy.id,
-                "name": strategy.name,
-                "description": strategy.description,
-                "risk_level": strategy.risk_level,
-                "target_return": strategy.target_return,
-                "investment_amount": strategy.investment_amount,
-                "created_at": strategy.created_at.isoformat(),
-                "updated_at": strategy.updated_at.isoformat(),
-                "performance": performance
-            }
-            strategy_list.append(strategy_info)
+        strategies = (await db.scalars(
+            select(Strategy)
+            .where(
+                Strategy.user_id == current_user.id,
+                Strategy.status == "active"
+            )
+            .order_by(Strategy.updated_at.desc())
+        )).all()
         
-        return {"strategies": strategy_list}
+        # 校验与JSON编码均在pydantic-core中完成，不构建中间字典
+        payload = strategy_history_adapter.dump_json(
+            strategy_history_adapter.validate_python(strategies)
+        )
+        return Response(content=b'{"strategies":' + payload + b"}", media_type="application/json")
         
     except Exception as e:
         logger.error(f"获取策略历史失败: {e}")
@@ -224,22 +254,28 @@ async def get_strategy_history(
 @router.delete("/{strategy_id}", summary="删除策略")
 async def delete_strategy(
     strategy_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除策略"""
     try:
-        strategy = db.query(Strategy).filter(
-            Strategy.id == strategy_id,
-            Strategy.user_id == current_user.id
-        ).first()
+        # 软删除（单条UPDATE同时完成归属校验，无需先查询）
+        result = await db.execute(
+            update(Strategy)
+            .where(
+                Strategy.id == strategy_id,
+                Strategy.user_id == current_user.id,
+                Strategy.status != "deleted"
+            )
+            .values(status="deleted")
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
         
-        if not strategy:
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="策略不存在")
         
-        # 软删除
-        strategy.status = "deleted"
-        db.commit()
+        await cache_service.delete_user_identity(current_user.id)
         
         return {"success": True, "message": "策略删除成功"}
         
@@ -253,17 +289,19 @@ async def delete_strategy(
 @router.get("/{strategy_id}/backtest", summary="获取策略回测结果")
 async def get_strategy_backtest(
     strategy_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取策略回测结果"""
     try:
-        strategy = db.query(Strategy).filter(
-            Strategy.id == strategy_id,
-            Strategy.user_id == current_user.id
-        ).first()
+        strategy_exists = await db.scalar(
+            select(Strategy.id).where(
+                Strategy.id == strategy_id,
+                Strategy.user_id == current_user.id
+            )
+        )
         
-        if not strategy:
+        if not strategy_exists:
             raise HTTPException(status_code=404, detail="策略不存在")
         
         # 获取回测数据（实际应用中从回测数据表获取）
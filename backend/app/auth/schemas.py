@@ -1,32 +1,45 @@
 """用户认证相关数据模型"""
 from typing import Optional
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 import re
 
 
+# 预编译校验用正则
+PHONE_NUMBER_PATTERN = re.compile(r'^1[3-9]\d{9}$')
+LETTER_PATTERN = re.compile(r'[A-Za-z]')
+DIGIT_PATTERN = re.compile(r'\d')
+
+
+def _validate_password_strength(v: str) -> str:
+    """验证密码强度"""
+    if len(v) < 8:
+        raise ValueError('密码长度不能少于8位')
+    if not LETTER_PATTERN.search(v):
+        raise ValueError('密码必须包含字母')
+    if not DIGIT_PATTERN.search(v):
+        raise ValueError('密码必须包含数字')
+    return v
+
+
 class UserRegister(BaseModel):
     """用户注册模型"""
     phone_number: str = Field(..., description="手机号")
     password: str = Field(..., min_length=8, description="密码")
     nickname: Optional[str] = Field(None, max_length=50, description="昵称")
     
-    @validator('phone_number')
+    @field_validator('phone_number')
+    @classmethod
     def validate_phone_number(cls, v):
         """验证手机号格式"""
-        if not re.match(r'^1[3-9]\d{9}$', v):
+        if not PHONE_NUMBER_PATTERN.match(v):
             raise ValueError('手机号格式不正确')
         return v
     
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         """验证密码强度"""
-        if len(v) < 8:
-            raise ValueError('密码长度不能少于8位')
-        if not re.search(r'[A-Za-z]', v):
-            raise ValueError('密码必须包含字母')
-        if not re.search(r'\d', v):
-            raise ValueError('密码必须包含数字')
-        return v
+        return _validate_password_strength(v)
 
 
 class UserLogin(BaseModel):
@@ -69,13 +82,8 @@ class PasswordChange(BaseModel):
     old_password: str = Field(..., description="旧密码")
     new_password: str = Field(..., min_length=8, description="新密码")
     
-    @validator('new_password')
+    @field_validator('new_password')
+    @classmethod
     def validate_new_password(cls, v):
         """验证新密码强度"""
-        if len(v) < 8:
-            raise ValueError('密码长度不能少于8位')
-        if not re.search(r'[A-Za-z]', v):
-            raise ValueError('密码必须包含字母')
-        if not re.search(r'\d', v):
-            raise ValueError('密码必须包含数字')
-        return v
+        return _validate_password_strength(v)
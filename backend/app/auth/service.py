@@ -4,7 +4,7 @@ from typing import Optional
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from app.models.user import User
-from app.core.security import verify_password, get_password_hash, create_access_token
+from app.core.security import verify_password_async, get_password_hash_async, create_access_token
 from app.auth.schemas import UserRegister, UserLogin, Token, UserResponse, PasswordChange
 from config.settings import settings
 
@@ -15,7 +15,7 @@ class AuthService:
     def __init__(self, db: Session):
         self.db = db
     
-    def register_user(self, user_data: UserRegister) -> Token:
+    async def register_user(self, user_data: UserRegister) -> Token:
         """用户注册"""
         # 检查手机号是否已存在
         existing_user = self.db.query(User).filter(
@@ -29,7 +29,7 @@ class AuthService:
             )
         
         # 创建新用户
-        password_hash = get_password_hash(user_data.password)
+        password_hash = await get_password_hash_async(user_data.password)
         new_user = User(
             phone_number=user_data.phone_number,
             password_hash=password_hash,
@@ -57,13 +57,15 @@ class AuthService:
             user=user_response
         )
     
-    def authenticate_user(self, user_data: UserLogin) -> Token:
+    async def authenticate_user(self, user_data: UserLogin) -> Token:
         """用户登录认证"""
         user = self.db.query(User).filter(
             User.phone_number == user_data.phone_number
         ).first()
         
-        if not user or not verify_password(user_data.password, user.password_hash):
+        # 用户不存在时同样执行一次哈希校验，避免通过响应耗时枚举手机号
+        password_hash = user.password_hash if user else None
+        if not await verify_password_async(user_data.password, password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="手机号或密码错误",
@@ -76,9 +78,9 @@ class AuthService:
                 detail="账户已被禁用"
             )
         
-        # 更新用户类型
-        user.update_user_type()
-        self.db.commit()
+        # 更新用户类型（类型未变化时不提交）
+        if user.update_user_type():
+            self.db.commit()
         
         # 生成访问令牌
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -121,7 +123,7 @@ class AuthService:
         
         return UserResponse.from_orm(user)
     
-    def change_password(self, user_id: int, password_data: PasswordChange) -> bool:
+    async def change_password(self, user_id: int, password_data: PasswordChange) -> bool:
         """修改密码"""
         user = self.get_user_by_id(user_id)
         if not user:
@@ -131,14 +133,14 @@ class AuthService:
             )
         
         # 验证旧密码
-        if not verify_password(password_data.old_password, user.password_hash):
+        if not await verify_password_async(password_data.old_password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="旧密码错误"
             )
         
         # 更新密码
-        user.password_hash = get_password_hash(password_data.new_password)
+        user.password_hash = await get_password_hash_async(password_data.new_password)
         self.db.commit()
         
         return True
@@ -152,6 +154,9 @@ class AuthService:
                 detail="用户不存在"
             )
         
+        if not user.is_active:
+            return True
+        
         user.is_active = False
         self.db.commit()
         
@@ -171,6 +176,9 @@ class AuthService:
         if not user:
             return False
         
+        if not user.is_new_user:
+            return True
+        
         user.is_new_user = False
         self.db.commit()
         
@@ -1,12 +1,33 @@
 """Redis客户端配置"""
 import redis.asyncio as redis
-from redis.asyncio import ConnectionPool
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 from config.settings import settings
-import json
+import orjson
 import logging
+import random
+import socket
 
 logger = logging.getLogger(__name__)
 
+# TCP保活参数：空闲60秒后探测，间隔10秒，连续3次失败断开（NAT环境下及时发现半开连接）
+KEEPALIVE_OPTIONS = {
+    option: value
+    for option, value in (
+        (getattr(socket, "TCP_KEEPIDLE", None), 60),
+        (getattr(socket, "TCP_KEEPINTVL", None), 10),
+        (getattr(socket, "TCP_KEEPCNT", None), 3),
+    )
+    if option is not None
+}
+
+def jitter_ttl(ttl: int) -> int:
+    """为过期时间加入±10%的随机偏移，避免同一批写入的键在同一时刻集中过期"""
+    spread = ttl // 10
+    return ttl + random.randint(-spread, spread) if spread else ttl
+
 
 class RedisClient:
     """Redis异步客户端"""
@@ -18,11 +39,22 @@ class RedisClient:
     async def connect(self):
         """连接Redis"""
         try:
-            self.pool = ConnectionPool.from_url(
+            # 连接池耗尽时短暂等待空闲连接，而不是直接抛出连接错误
+            self.pool = BlockingConnectionPool.from_url(
                 settings.REDIS_URL,
+                timeout=settings.REDIS_POOL_TIMEOUT,
                 encoding="utf-8",
-                decode_responses=True,
-                max_connections=20
+                # 返回原始bytes，由orjson直接解析，省去一次UTF-8解码
+                decode_responses=False,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                # redis-py建立连接时已设置TCP_NODELAY，此处开启保活并设置超时
+                socket_keepalive=True,
+                socket_keepalive_options=KEEPALIVE_OPTIONS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                retry=Retry(ExponentialBackoff(), settings.REDIS_RETRY_ATTEMPTS),
+                retry_on_error=[RedisConnectionError, RedisTimeoutError]
             )
             self.redis = redis.Redis(connection_pool=self.pool)
             
@@ -31,9 +63,19 @@ class RedisClient:
             logger.info("Redis连接成功")
             
         except Exception as e:
-            logger.error(f"Redis连接失败: {e}")
+            logger.error("Redis连接失败: %s", e)
             raise
     
+    @staticmethod
+    def _encode(value) -> bytes:
+        """序列化缓存值（orjson直接输出UTF-8字节）"""
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    
+    @staticmethod
+    def _decode(value: bytes):
+        """反序列化缓存值"""
+        return orjson.loads(value)
+    
     async def disconnect(self):
         """断开Redis连接"""
         if self.redis:
@@ -47,23 +89,32 @@ class RedisClient:
         try:
             value = await self.redis.get(key)
             if value:
-                return json.loads(value)
+                return self._decode(value)
             return None
         except Exception as e:
-            logger.error(f"Redis GET错误 {key}: {e}")
+            logger.error("Redis GET错误 %s: %s", key, e)
             return None
     
     async def set(self, key: str, value, ttl: int = None):
         """设置缓存值"""
         try:
-            json_value = json.dumps(value, ensure_ascii=False, default=str)
-            if ttl:
-                await self.redis.setex(key, ttl, json_value)
-            else:
-                await self.redis.set(key, json_value)
+            # SET ... EX一条命令覆盖有无过期时间两种情况
+            await self.redis.set(key, self._encode(value), ex=jitter_ttl(ttl) if ttl else None)
             return True
         except Exception as e:
-            logger.error(f"Redis SET错误 {key}: {e}")
+            logger.error("Redis SET错误 %s: %s", key, e)
+            return False
+    
+    async def set_many(self, mapping: dict, ttl: int = None):
+        """通过一次流水线设置多个缓存值（各键独立随机偏移过期时间）"""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, self._encode(value), ex=jitter_ttl(ttl) if ttl else None)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error("Redis SET错误 %s: %s", list(mapping), e)
             return False
     
     async def delete(self, key: str):
@@ -72,15 +123,25 @@ class RedisClient:
             await self.redis.delete(key)
             return True
         except Exception as e:
-            logger.error(f"Redis DELETE错误 {key}: {e}")
+            logger.error("Redis DELETE错误 %s: %s", key, e)
+            return False
+    
+    async def delete_many(self, *keys: str):
+        """批量删除缓存（一次UNLINK，由Redis在后台释放内存）"""
+        try:
+            if keys:
+                await self.redis.unlink(*keys)
+            return True
+        except Exception as e:
+            logger.error("Redis UNLINK错误 %s: %s", keys, e)
             return False
     
     async def exists(self, key: str) -> bool:
         """检查键是否存在"""
         try:
-            return await self.redis.exists(key) > 0
+            return await self.redis.exists(key) == 1
         except Exception as e:
-            logger.error(f"Redis EXISTS错误 {key}: {e}")
+            logger.error("Redis EXISTS错误 %s: %s", key, e)
             return False
     
     async def expire(self, key: str, ttl: int):
@@ -89,7 +150,7 @@ class RedisClient:
             await self.redis.expire(key, ttl)
             return True
         except Exception as e:
-            logger.error(f"Redis EXPIRE错误 {key}: {e}")
+            logger.error("Redis EXPIRE错误 %s: %s", key, e)
             return False
     
     async def incr(self, key: str, amount: int = 1):
@@ -97,7 +158,7 @@ class RedisClient:
         try:
             return await self.redis.incr(key, amount)
         except Exception as e:
-            logger.error(f"Redis INCR错误 {key}: {e}")
+            logger.error("Redis INCR错误 %s: %s", key, e)
             return None
     
     async def hget(self, name: str, key: str):
@@ -105,44 +166,101 @@ class RedisClient:
         try:
             value = await self.redis.hget(name, key)
             if value:
-                return json.loads(value)
+                return self._decode(value)
             return None
         except Exception as e:
-            logger.error(f"Redis HGET错误 {name}.{key}: {e}")
+            logger.error("Redis HGET错误 %s.%s: %s", name, key, e)
             return None
     
     async def hset(self, name: str, key: str, value):
         """设置哈希字段值"""
         try:
-            json_value = json.dumps(value, ensure_ascii=False, default=str)
+            json_value = self._encode(value)
             await self.redis.hset(name, key, json_value)
             return True
         except Exception as e:
-            logger.error(f"Redis HSET错误 {name}.{key}: {e}")
+            logger.error("Redis HSET错误 %s.%s: %s", name, key, e)
             return False
     
+    async def hset_versioned(self, name: str, mapping: dict, version_field: str, version,
+                             ttl: int = None, replace: bool = False):
+        """在一个事务中读取哈希的版本号字段，再写入多个字段和新的版本号（replace为True时先清空哈希），并设置过期时间
+        
+        返回(是否写入成功, 写入前的版本号)，调用方据此判断上次读取后是否有其他进程写入过该哈希。
+        """
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hget(name, version_field)
+                if replace:
+                    pipe.delete(name)
+                pipe.hset(name, mapping={
+                    **{key: self._encode(value) for key, value in mapping.items()},
+                    version_field: self._encode(version)
+                })
+                if ttl:
+                    pipe.expire(name, ttl)
+                previous, *_ = await pipe.execute()
+            return True, self._decode(previous) if previous else None
+        except Exception as e:
+            logger.error("Redis HSET错误 %s: %s", name, e)
+            return False, None
+    
     async def hgetall(self, name: str):
         """获取所有哈希字段"""
         try:
             data = await self.redis.hgetall(name)
+            try:
+                # 常见情况下所有字段均为JSON，一次推导式完成解析
+                return {key.decode(): self._decode(value) for key, value in data.items()}
+            except orjson.JSONDecodeError:
+                pass
+            
+            # 存在非JSON字段时逐个解析，非JSON值按字符串返回
             result = {}
             for key, value in data.items():
                 try:
-                    result[key] = json.loads(value)
-                except:
-                    result[key] = value
+                    result[key.decode()] = self._decode(value)
+                except orjson.JSONDecodeError:
+                    result[key.decode()] = value.decode()
             return result
         except Exception as e:
-            logger.error(f"Redis HGETALL错误 {name}: {e}")
+            logger.error("Redis HGETALL错误 %s: %s", name, e)
             return {}
     
+    async def rpush_many(self, name: str, values: list, max_length: int = None,
+                         ttl: int = None, replace: bool = False):
+        """向列表尾部追加多个值，可只保留最近max_length个并设置过期时间"""
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if replace:
+                    pipe.delete(name)
+                if values:
+                    pipe.rpush(name, *(self._encode(value) for value in values))
+                if max_length:
+                    pipe.ltrim(name, -max_length, -1)
+                if ttl:
+                    pipe.expire(name, ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error("Redis RPUSH错误 %s: %s", name, e)
+            return False
+    
+    async def lrange(self, name: str, start: int = 0, end: int = -1) -> list:
+        """获取列表元素"""
+        try:
+            return [self._decode(value) for value in await self.redis.lrange(name, start, end)]
+        except Exception as e:
+            logger.error("Redis LRANGE错误 %s: %s", name, e)
+            return []
+    
     async def hdel(self, name: str, key: str):
         """删除哈希字段"""
         try:
             await self.redis.hdel(name, key)
             return True
         except Exception as e:
-            logger.error(f"Redis HDEL错误 {name}.{key}: {e}")
+            logger.error("Redis HDEL错误 %s.%s: %s", name, key, e)
             return False
 
 
@@ -1,11 +1,34 @@
 """缓存服务"""
-from typing import Any, Optional
-from app.cache.redis_client import redis_client
+from typing import Any, Dict, Optional, Tuple
+from cachetools import TTLCache
+from app.cache.redis_client import redis_client, jitter_ttl
 from config.settings import settings
+import asyncio
 import logging
+import secrets
 
 logger = logging.getLogger(__name__)
 
+# 缓存中保留的对话历史条数
+CONVERSATION_HISTORY_LENGTH = 100
+
+# 对话上下文哈希中的版本号字段，每次写入时更新为新的随机值，用于校验进程内缓存是否仍是最新
+CONTEXT_VERSION_FIELD = "_version"
+
+# 进程内对话上下文缓存：会话ID -> (版本号, 上下文)，版本号与Redis一致时无需从Redis加载完整上下文和历史
+_local_contexts = TTLCache(
+    maxsize=settings.LOCAL_CACHE_CONVERSATION_SIZE,
+    ttl=settings.LOCAL_CACHE_TTL_CONVERSATION
+)
+# 会话ID -> 正在从Redis加载上下文的任务，并发读取同一会话时只加载一次
+_context_loads: Dict[str, asyncio.Task] = {}
+
+# 待写入Redis的ETF缓存：键 -> (值, 已重试次数)，攒批后通过一次流水线写入
+_pending_etf_writes: Dict[str, Tuple[Any, int]] = {}
+# 当前批次的写入结果，批次内的调用方共同等待
+_etf_write_result: Optional[asyncio.Future] = None
+# 当前的ETF缓存批量写入任务
+_etf_flush_task: Optional[asyncio.Task] = None
 
 class CacheService:
     """缓存服务类"""
@@ -29,11 +52,27 @@ class CacheService:
         key = f"user:session:{user_id}"
         return await self.client.delete(key)
     
-    # ETF数据缓存
+    # 用户身份识别缓存
+    async def set_user_identity(self, user_id: int, identity: dict) -> bool:
+        """设置用户身份识别结果缓存"""
+        key = f"user:identity:{user_id}"
+        return await self.client.set(key, identity, settings.CACHE_TTL_USER_IDENTITY)
+    
+    async def get_user_identity(self, user_id: int) -> Optional[dict]:
+        """获取用户身份识别结果缓存"""
+        key = f"user:identity:{user_id}"
+        return await self.client.get(key)
+    
+    async def delete_user_identity(self, user_id: int) -> bool:
+        """删除用户身份识别结果缓存"""
+        key = f"user:identity:{user_id}"
+        return await self.client.delete(key)
+    
+    # ETF数据缓存（写入攒批，见_write_etf_cache）
     async def set_etf_data(self, etf_code: str, data: dict) -> bool:
         """设置ETF数据缓存"""
         key = f"etf:data:{etf_code}"
-        return await self.client.set(key, data, settings.CACHE_TTL_ETF_DATA)
+        return await self._write_etf_cache(key, data)
     
     async def get_etf_data(self, etf_code: str) -> Optional[dict]:
         """获取ETF数据缓存"""
@@ -43,13 +82,57 @@ class CacheService:
     async def set_etf_list(self, filter_key: str, etf_list: list) -> bool:
         """设置ETF列表缓存"""
         key = f"etf:list:{filter_key}"
-        return await self.client.set(key, etf_list, settings.CACHE_TTL_ETF_DATA)
+        return await self._write_etf_cache(key, etf_list)
     
     async def get_etf_list(self, filter_key: str) -> Optional[list]:
         """获取ETF列表缓存"""
         key = f"etf:list:{filter_key}"
         return await self.client.get(key)
     
+    async def _write_etf_cache(self, key: str, value: Any) -> bool:
+        """将ETF缓存加入待写入批次，等待该批次写入Redis后返回是否写入成功
+        
+        调用方等待写入完成，因此在asyncio.run中执行的任务返回前缓存已写入，事件循环关闭不会丢失写入。
+        """
+        global _etf_write_result, _etf_flush_task
+        
+        loop = asyncio.get_running_loop()
+        _pending_etf_writes[key] = (value, 0)
+        
+        # 每次asyncio.run都会创建新的事件循环，不能沿用绑定在旧循环上的Future和任务
+        if _etf_write_result is None or _etf_write_result.get_loop() is not loop:
+            _etf_write_result = loop.create_future()
+        result = _etf_write_result
+        
+        if _etf_flush_task is None or _etf_flush_task.done() or _etf_flush_task.get_loop() is not loop:
+            _etf_flush_task = loop.create_task(self._flush_etf_writes())
+        
+        return await asyncio.shield(result)
+    
+    async def _flush_etf_writes(self):
+        """每隔CACHE_WRITE_FLUSH_INTERVAL将攒下的ETF缓存通过一次流水线写入Redis"""
+        global _etf_write_result
+        
+        while _pending_etf_writes:
+            await asyncio.sleep(settings.CACHE_WRITE_FLUSH_INTERVAL)
+            
+            batch = dict(_pending_etf_writes)
+            _pending_etf_writes.clear()
+            result, _etf_write_result = _etf_write_result, None
+            
+            success = await self.client.set_many(
+                {key: value for key, (value, _) in batch.items()},
+                settings.CACHE_TTL_ETF_DATA
+            )
+            if not success:
+                # 写入失败的键放回下一批重试（期间已被重新设置的键以新值为准）
+                for key, (value, retries) in batch.items():
+                    if retries < settings.CACHE_WRITE_MAX_RETRIES:
+                        _pending_etf_writes.setdefault(key, (value, retries + 1))
+            
+            if result is not None and not result.done():
+                result.set_result(success)
+    
     # 策略缓存
     async def set_strategy_data(self, strategy_id: int, data: dict) -> bool:
         """设置策略数据缓存"""
@@ -87,28 +170,155 @@ class CacheService:
         key = f"news:data:{news_key}"
         return await self.client.get(key)
     
-    # 对话上下文缓存
+    # 对话上下文缓存（标量字段存为哈希，对话历史存为独立列表）
+    # 多个进程（多个uvicorn worker、Celery worker）共享同一会话，进程内缓存只在版本号与Redis一致时使用；
+    # 写入时先写历史列表再写带版本号的哈希，读取到新版本号时历史列表已是新的
     async def set_conversation_context(self, session_id: str, context: dict) -> bool:
-        """设置对话上下文缓存"""
-        key = f"conversation:context:{session_id}"
-        return await self.client.set(key, context, settings.CACHE_TTL_CONVERSATION)
+        """设置对话上下文缓存（整体替换）"""
+        fields = {key: value for key, value in context.items() if key != "conversation_history"}
+        history = (context.get("conversation_history") or [])[-CONVERSATION_HISTORY_LENGTH:]
+        
+        # 正在进行的加载结果可能早于本次写入，不再写入进程内缓存
+        _context_loads.pop(session_id, None)
+        
+        # 哈希和历史列表使用同一个随机偏移后的过期时间，保证同时过期
+        ttl = jitter_ttl(settings.CACHE_TTL_CONVERSATION)
+        version = secrets.token_hex(8)
+        
+        history_written = await self.client.rpush_many(
+            f"conversation:history:{session_id}", history,
+            ttl=ttl, replace=True
+        )
+        written, _ = await self.client.hset_versioned(
+            f"conversation:context:{session_id}", fields,
+            CONTEXT_VERSION_FIELD, version, ttl, replace=True
+        )
+        
+        if written and history_written:
+            _local_contexts[session_id] = (version, {**fields, "conversation_history": list(history)})
+        else:
+            _local_contexts.pop(session_id, None)
+        return written and history_written
     
     async def get_conversation_context(self, session_id: str) -> Optional[dict]:
-        """获取对话上下文缓存"""
-        key = f"conversation:context:{session_id}"
-        return await self.client.get(key)
+        """获取对话上下文缓存（进程内缓存经Redis版本号校验后使用，返回副本）"""
+        version = await self.client.hget(f"conversation:context:{session_id}", CONTEXT_VERSION_FIELD)
+        if version is None:
+            # 上下文不存在或已过期
+            _local_contexts.pop(session_id, None)
+            return None
+        
+        cached = _local_contexts.get(session_id)
+        if cached is not None and cached[0] == version:
+            return dict(cached[1])
+        
+        load = _context_loads.get(session_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load_conversation_context(session_id))
+            _context_loads[session_id] = load
+        
+        # 单个调用方被取消时不影响其他等待同一加载任务的调用方
+        context = await asyncio.shield(load)
+        if context is None:
+            return None
+        
+        return dict(context)
+    
+    async def _load_conversation_context(self, session_id: str) -> Optional[dict]:
+        """从Redis加载对话上下文并写入进程内缓存"""
+        load = asyncio.current_task()
+        try:
+            # 先读哈希（含版本号）再读历史列表，保证历史不早于读到的版本号
+            context = await self.client.hgetall(f"conversation:context:{session_id}")
+            version = context.pop(CONTEXT_VERSION_FIELD, None)
+            if not context:
+                return None
+            
+            context["conversation_history"] = await self.client.lrange(
+                f"conversation:history:{session_id}"
+            )
+            
+            # 加载期间上下文被写入时以写入为准，不缓存本次读取的旧值
+            if _context_loads.get(session_id) is load:
+                _local_contexts[session_id] = (version, context)
+            return context
+        finally:
+            if _context_loads.get(session_id) is load:
+                del _context_loads[session_id]
+    
+    async def _write_context_fields(self, session_id: str, fields: dict,
+                                    history: Optional[list], ttl: int) -> bool:
+        """写入上下文字段和新版本号；写入前的版本号与进程内缓存一致时（期间没有其他进程写入）同步更新进程内缓存"""
+        _context_loads.pop(session_id, None)
+        version = secrets.token_hex(8)
+        
+        written, previous_version = await self.client.hset_versioned(
+            f"conversation:context:{session_id}", fields,
+            CONTEXT_VERSION_FIELD, version, ttl
+        )
+        
+        cached = _local_contexts.get(session_id)
+        if written and cached is not None and cached[0] == previous_version:
+            context = cached[1]
+            context.update(fields)
+            if history is not None:
+                context["conversation_history"] = history
+            _local_contexts[session_id] = (version, context)
+        else:
+            _local_contexts.pop(session_id, None)
+        return written
     
     async def update_conversation_context(self, session_id: str, context_update: dict) -> bool:
-        """更新对话上下文缓存"""
-        key = f"conversation:context:{session_id}"
-        current_context = await self.client.get(key) or {}
-        current_context.update(context_update)
-        return await self.client.set(key, current_context, settings.CACHE_TTL_CONVERSATION)
+        """更新对话上下文缓存（只写入变化的字段）"""
+        context_update = dict(context_update)
+        history = context_update.pop("conversation_history", None)
+        if history is not None:
+            history = history[-CONVERSATION_HISTORY_LENGTH:]
+        
+        ttl = jitter_ttl(settings.CACHE_TTL_CONVERSATION)
+        history_key = f"conversation:history:{session_id}"
+        if history is None:
+            history_written = await self.client.expire(history_key, ttl)
+        else:
+            history_written = await self.client.rpush_many(
+                history_key, history,
+                ttl=ttl, replace=True
+            )
+        
+        written = await self._write_context_fields(
+            session_id, context_update,
+            list(history) if history is not None else None, ttl
+        )
+        return written and history_written
+    
+    async def append_conversation_history(self, session_id: str, *entries: dict) -> bool:
+        """追加对话历史（只保留最近的记录）"""
+        ttl = jitter_ttl(settings.CACHE_TTL_CONVERSATION)
+        history_written = await self.client.rpush_many(
+            f"conversation:history:{session_id}", list(entries),
+            max_length=CONVERSATION_HISTORY_LENGTH,
+            ttl=ttl
+        )
+        
+        history = None
+        cached = _local_contexts.get(session_id)
+        if cached is not None:
+            history = (
+                cached[1].get("conversation_history", []) + list(entries)
+            )[-CONVERSATION_HISTORY_LENGTH:]
+        
+        # 历史列表变化同样更新版本号，使其他进程的进程内缓存失效
+        written = await self._write_context_fields(session_id, {}, history, ttl)
+        return written and history_written
     
     async def delete_conversation_context(self, session_id: str) -> bool:
         """删除对话上下文缓存"""
-        key = f"conversation:context:{session_id}"
-        return await self.client.delete(key)
+        _context_loads.pop(session_id, None)
+        _local_contexts.pop(session_id, None)
+        return await self.client.delete_many(
+            f"conversation:context:{session_id}",
+            f"conversation:history:{session_id}"
+        )
     
     # 任务状态缓存
     async def set_task_status(self, task_id: str, status: dict) -> bool:
@@ -150,8 +360,11 @@ class CacheService:
     async def clear_user_cache(self, user_id: int) -> bool:
         """清除用户相关缓存"""
         try:
-            await self.delete_user_session(user_id)
-            await self.delete_user_strategies(user_id)
+            await self.client.delete_many(
+                f"user:session:{user_id}",
+                f"user:strategies:{user_id}",
+                f"user:identity:{user_id}"
+            )
             logger.info(f"已清除用户 {user_id} 的缓存")
             return True
         except Exception as e:
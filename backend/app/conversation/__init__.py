@@ -1,6 +1,14 @@
 """对话服务模块"""
 from .service import ConversationService
 from .websocket_manager import WebSocketManager
+from .writer import ConversationWriter, conversation_writer
 from .schemas import ConversationMessage, ConversationResponse
 
-__all__ = ["ConversationService", "WebSocketManager", "ConversationMessage", "ConversationResponse"]
+__all__ = [
+    "ConversationService",
+    "WebSocketManager",
+    "ConversationWriter",
+    "conversation_writer",
+    "ConversationMessage",
+    "ConversationResponse"
+]
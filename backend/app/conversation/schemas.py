@@ -1,6 +1,6 @@
 """对话相关数据模型"""
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from datetime import datetime
 
 
@@ -42,9 +42,16 @@ class ConversationHistoryItem(BaseModel):
     message_type: str
     content: str
     round_number: int
-    created_at: str
+    created_at: datetime
     context_data: Optional[Dict[str, Any]] = None
     extracted_elements: Optional[Dict[str, Any]] = None
+    
+    class Config:
+        from_attributes = True
+
+
+# 批量校验ORM对话记录列表
+conversation_history_adapter = TypeAdapter(List[ConversationHistoryItem])
 
 
 class ConversationHistoryResponse(BaseModel):
@@ -1,10 +1,13 @@
 """对话服务"""
 from typing import Dict, Any, List, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.models.conversation import Conversation
+from app.models.conversation import Conversation, ConversationSession
 from app.models.user import User
-from app.cache.service import CacheService
-from app.agent.agent_core import AgentCore
+from app.models.strategy import Strategy
+from app.cache.service import cache_service
+from app.agent.agent_core import get_agent_core
+from app.conversation.writer import conversation_writer
 from app.utils.helpers import generate_session_id
 from langchain.llms.base import LLM
 # 移除uuid依赖，使用helpers中的ID生成函数
@@ -13,6 +16,25 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# 欢迎消息
+WELCOME_NEW_USER = (
+    "欢迎使用ETF资产配置策略系统！我是您的专属投资顾问助手。\n\n"
+    "ETF资产配置策略可以帮助您：\n"
+    "• 通过分散投资降低风险\n"
+    "• 获得稳健的长期收益\n"
+    "• 实现动态再平衡\n\n"
+    "让我们开始了解您的投资需求吧！请告诉我您的风险偏好和投资目标。"
+)
+
+WELCOME_RETURNING_USER_TEMPLATE = (
+    "欢迎回来！{strategy_info}让我为您提供最新的投资建议。\n\n"
+    "我可以帮您：\n"
+    "• 查看和优化现有策略\n"
+    "• 获取最新市场资讯\n"
+    "• 制定新的投资策略\n\n"
+    "请告诉我您想要做什么？"
+)
+
 
 class ConversationService:
     """对话服务类"""
@@ -20,8 +42,9 @@ class ConversationService:
     def __init__(self, db: Session, llm: LLM):
         self.db = db
         self.llm = llm
-        self.cache_service = CacheService()
-        self.agent_core = AgentCore(db, llm)
+        # 缓存服务和智能体为进程内共享实例，不随每个请求重新创建
+        self.cache_service = cache_service
+        self.agent_core = get_agent_core(llm)
     
     async def create_session(self, user_id: int) -> Dict[str, Any]:
         """创建对话会话"""
@@ -29,16 +52,16 @@ class ConversationService:
             # 生成会话ID
             session_id = generate_session_id()
             
-            # 获取用户信息
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if not user:
+            # 检查用户是否存在（只查询主键，不加载用户对象）
+            if self.db.query(User.id).filter(User.id == user_id).first() is None:
                 raise ValueError("用户不存在")
             
-            # 判断用户类型
-            is_new_user = len(user.strategies) == 0
+            # 判断用户类型：没有任何策略即为新用户（一次单行查询，不加载策略集合）
+            best_strategy_name = self._get_best_strategy_name(user_id)
+            is_new_user = best_strategy_name is None
             
             # 生成欢迎消息
-            welcome_message = self._generate_welcome_message(user, is_new_user)
+            welcome_message = self._generate_welcome_message(best_strategy_name)
             
             # 初始化会话上下文
             session_context = {
@@ -55,17 +78,12 @@ class ConversationService:
             # 缓存会话上下文
             await self.cache_service.set_conversation_context(session_id, session_context)
             
-            # 保存欢迎消息到数据库
-            welcome_conversation = Conversation(
-                user_id=user_id,
-                session_id=session_id,
-                message_type="system",
-                content=welcome_message,
+            # 保存欢迎消息到数据库（后台写入器同时更新会话汇总）
+            conversation_writer.enqueue(
+                user_id, session_id, "system", welcome_message,
                 round_number=1,
                 context_data={"session_start": True}
             )
-            self.db.add(welcome_conversation)
-            self.db.commit()
             
             return {
                 "session_id": session_id,
@@ -91,47 +109,39 @@ class ConversationService:
             context["message_count"] += 1
             round_number = context["message_count"]
             
-            # 保存用户消息到数据库
-            user_conversation = Conversation(
-                user_id=user_id,
-                session_id=session_id,
-                message_type="user",
-                content=message,
+            # 保存用户消息到数据库（在智能体处理前入队，消息时间为收到消息的时间，处理失败也会保存）
+            conversation_writer.enqueue(
+                user_id, session_id, "user", message,
                 round_number=round_number,
                 context_data={"stage": context.get("current_stage")}
             )
-            self.db.add(user_conversation)
-            self.db.commit()
             
             # 使用智能体处理消息
             result = await self.agent_core.process_conversation(
-                user_id, session_id, message, context
+                user_id, session_id, message, self.db, context
             )
             
             if result["success"]:
                 response_message = result["response"]
                 
                 # 保存助手回复到数据库
-                assistant_conversation = Conversation(
-                    user_id=user_id,
-                    session_id=session_id,
-                    message_type="assistant",
-                    content=response_message,
+                conversation_writer.enqueue(
+                    user_id, session_id, "assistant", response_message,
                     round_number=round_number,
                     context_data=result.get("execution_result"),
                     extracted_elements=result.get("execution_result", {}).get("extracted_elements")
                 )
-                self.db.add(assistant_conversation)
-                self.db.commit()
                 
-                # 更新会话上下文
-                context.update({
+                # 更新会话上下文（只写入本轮变化的字段）
+                # 等待智能体的后台上下文写入完成，避免其覆盖本次写入
+                await self.agent_core.wait_context_write(session_id)
+                await self.cache_service.update_conversation_context(session_id, {
+                    "message_count": round_number,
                     "last_message": message,
                     "last_response": response_message,
                     "current_stage": result.get("stage"),
                     "last_execution_result": result.get("execution_result")
                 })
-                await self.cache_service.set_conversation_context(session_id, context)
                 
                 return {
                     "success": True,
@@ -161,22 +171,36 @@ class ConversationService:
                                      limit: int = 50) -> List[Dict[str, Any]]:
         """获取对话历史"""
         try:
-            conversations = self.db.query(Conversation).filter(
+            # 只查询需要的列，不构建ORM实例
+            rows = self.db.query(
+                Conversation.id,
+                Conversation.message_type,
+                Conversation.content,
+                Conversation.round_number,
+                Conversation.created_at,
+                Conversation.context_data,
+                Conversation.extracted_elements
+            ).filter(
                 Conversation.user_id == user_id,
                 Conversation.session_id == session_id
-            ).order_by(Conversation.created_at.desc()).limit(limit).all()
+            ).order_by(
+                Conversation.created_at.desc(), Conversation.id.desc()
+            ).limit(limit).all()
+            rows.reverse()  # 按时间正序
             
-            history = []
-            for conv in reversed(conversations):  # 按时间正序
-                history.append({
-                    "id": conv.id,
-                    "message_type": conv.message_type,
-                    "content": conv.content,
-                    "round_number": conv.round_number,
-                    "created_at": conv.created_at.isoformat(),
-                    "context_data": conv.context_data,
-                    "extracted_elements": conv.extracted_elements
-                })
+            history = [
+                {
+                    "id": conv_id,
+                    "message_type": message_type,
+                    "content": content,
+                    "round_number": round_number,
+                    "created_at": created_at.isoformat(),
+                    "context_data": context_data,
+                    "extracted_elements": extracted_elements
+                }
+                for (conv_id, message_type, content, round_number,
+                     created_at, context_data, extracted_elements) in rows
+            ]
             
             return history
             
@@ -187,44 +211,29 @@ class ConversationService:
     async def get_user_sessions(self, user_id: int) -> List[Dict[str, Any]]:
         """获取用户对话会话列表"""
         try:
-            # 获取用户的所有会话ID
-            sessions_query = self.db.query(Conversation.session_id).filter(
-                Conversation.user_id == user_id
-            ).distinct().all()
+            # 读取会话汇总表（随对话记录写入维护），无需扫描用户的全部对话记录
+            sessions = self.db.query(
+                ConversationSession.session_id,
+                ConversationSession.last_message_preview,
+                ConversationSession.last_message_time,
+                ConversationSession.created_at,
+                ConversationSession.message_count,
+                ConversationSession.current_stage
+            ).filter(
+                ConversationSession.user_id == user_id
+            ).order_by(ConversationSession.last_message_time.desc()).all()
             
-            session_list = []
-            for session_tuple in sessions_query:
-                session_id = session_tuple[0]
-                
-                # 获取会话的最后一条消息和第一条消息
-                last_message = self.db.query(Conversation).filter(
-                    Conversation.session_id == session_id,
-                    Conversation.user_id == user_id
-                ).order_by(Conversation.created_at.desc()).first()
-                
-                first_message = self.db.query(Conversation).filter(
-                    Conversation.session_id == session_id,
-                    Conversation.user_id == user_id
-                ).order_by(Conversation.created_at.asc()).first()
-                
-                message_count = self.db.query(Conversation).filter(
-                    Conversation.session_id == session_id,
-                    Conversation.user_id == user_id
-                ).count()
-                
-                if last_message and first_message:
-                    session_info = {
-                        "session_id": session_id,
-                        "last_message": last_message.content[:50] + "..." if len(last_message.content) > 50 else last_message.content,
-                        "last_message_time": last_message.created_at.isoformat(),
-                        "created_time": first_message.created_at.isoformat(),
-                        "message_count": message_count,
-                        "current_stage": last_message.context_data.get("stage") if last_message.context_data else None
-                    }
-                    session_list.append(session_info)
-            
-            # 按最后消息时间排序
-            session_list.sort(key=lambda x: x["last_message_time"], reverse=True)
+            session_list = [
+                {
+                    "session_id": session.session_id,
+                    "last_message": session.last_message_preview,
+                    "last_message_time": session.last_message_time.isoformat(),
+                    "created_time": session.created_at.isoformat(),
+                    "message_count": session.message_count,
+                    "current_stage": session.current_stage
+                }
+                for session in sessions
+            ]
             
             return session_list
             
@@ -241,6 +250,11 @@ class ConversationService:
                 Conversation.session_id == session_id
             ).delete()
             
+            self.db.query(ConversationSession).filter(
+                ConversationSession.user_id == user_id,
+                ConversationSession.session_id == session_id
+            ).delete(synchronize_session=False)
+            
             self.db.commit()
             
             # 删除缓存中的会话上下文
@@ -254,35 +268,22 @@ class ConversationService:
             self.db.rollback()
             return False
     
-    def _generate_welcome_message(self, user: User, is_new_user: bool) -> str:
+    def _get_best_strategy_name(self, user_id: int) -> Optional[str]:
+        """获取用户目标收益最高的策略名称，没有策略时返回None"""
+        return self.db.query(Strategy.name).filter(
+            Strategy.user_id == user_id
+        ).order_by(
+            func.coalesce(Strategy.target_return, 0).desc(), Strategy.id
+        ).limit(1).scalar()
+    
+    @staticmethod
+    def _generate_welcome_message(best_strategy_name: Optional[str]) -> str:
         """生成欢迎消息"""
-        if is_new_user:
-            return (
-                f"欢迎使用ETF资产配置策略系统！我是您的专属投资顾问助手。\n\n"
-                f"ETF资产配置策略可以帮助您：\n"
-                f"• 通过分散投资降低风险\n"
-                f"• 获得稳健的长期收益\n"
-                f"• 实现动态再平衡\n\n"
-                f"让我们开始了解您的投资需求吧！请告诉我您的风险偏好和投资目标。"
-            )
-        else:
-            # 获取用户最好的策略
-            best_strategy = None
-            if user.strategies:
-                best_strategy = max(user.strategies, key=lambda s: s.target_return or 0)
-            
-            strategy_info = ""
-            if best_strategy:
-                strategy_info = f"您的'{best_strategy.name}'策略表现不错，"
-            
-            return (
-                f"欢迎回来！{strategy_info}让我为您提供最新的投资建议。\n\n"
-                f"我可以帮您：\n"
-                f"• 查看和优化现有策略\n"
-                f"• 获取最新市场资讯\n"
-                f"• 制定新的投资策略\n\n"
-                f"请告诉我您想要做什么？"
-            )
+        if best_strategy_name is None:
+            return WELCOME_NEW_USER
+        
+        strategy_info = f"您的'{best_strategy_name}'策略表现不错，" if best_strategy_name else ""
+        return WELCOME_RETURNING_USER_TEMPLATE.format(strategy_info=strategy_info)
     
     async def get_session_context(self, session_id: str) -> Optional[Dict[str, Any]]:
         """获取会话上下文"""
@@ -1,40 +1,73 @@
 """WebSocket连接管理器"""
-from typing import Dict, Set, Any, Callable
+from typing import Dict, Optional, Sequence, Set, Tuple, Any, Callable
 from fastapi import WebSocket, WebSocketDisconnect
-import json
+import orjson
 import asyncio
+import sys
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 单次发送超时（秒），超时的连接视为失效
+SEND_TIMEOUT = 5.0
+
+# 每个连接待发送消息队列的长度上限
+SEND_QUEUE_SIZE = 256
+
+# 队列满时丢弃最旧消息的消息类型（状态/心跳类，只关心最新值），其余类型队列满时断开慢客户端
+DROP_OLDEST_MESSAGE_TYPES = frozenset({"status_update", "pong"})
+
+# 清理非活跃连接时单次ping的超时（秒）
+PING_TIMEOUT = 2.0
+
 
 class WebSocketManager:
-    """WebSocket连接管理器"""
+    """WebSocket连接管理器
+    
+    每个连接有独立的发送队列和发送任务：发送方只把消息放入队列即返回，
+    由连接自己的发送任务写入网络，慢客户端不会拖慢其他连接和调用方。
+    """
     
     def __init__(self):
         # 活跃连接：session_id -> WebSocket
         self.active_connections: Dict[str, WebSocket] = {}
+        # 活跃会话ID快照，仅在连接建立/断开时重建，广播时直接遍历
+        self._session_ids: Tuple[str, ...] = ()
         # 用户会话映射：user_id -> Set[session_id]
         self.user_sessions: Dict[int, Set[str]] = {}
+        # 会话所属用户：session_id -> user_id（断开连接时直接定位用户）
+        self.session_to_user: Dict[str, int] = {}
         # 状态更新回调
         self.status_callbacks: Dict[str, Callable] = {}
+        # 待发送消息队列：session_id -> Queue
+        self.send_queues: Dict[str, asyncio.Queue] = {}
+        # 发送任务：session_id -> Task
+        self.send_tasks: Dict[str, asyncio.Task] = {}
     
-    async def connect(self, websocket: WebSocket, session_id: str, user_id: int):
-        """建立WebSocket连接"""
+    async def connect(self, websocket: WebSocket, session_id: str, user_id: Optional[int] = None):
+        """建立WebSocket连接（连接时未知用户的，收到消息后通过bind_user关联）"""
         try:
             await websocket.accept()
+            # 驻留会话ID，与生成时的字符串共享同一对象
+            session_id = sys.intern(session_id)
             
             # 断开之前的连接（如果存在）
             if session_id in self.active_connections:
                 await self.disconnect(session_id)
             
-            # 添加新连接
+            # 添加新连接并启动发送任务
             self.active_connections[session_id] = websocket
+            self._session_ids = tuple(self.active_connections)
+            queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+            self.send_queues[session_id] = queue
+            self.send_tasks[session_id] = asyncio.create_task(
+                self._relay(session_id, websocket, queue)
+            )
             
             # 更新用户会话映射
-            if user_id not in self.user_sessions:
-                self.user_sessions[user_id] = set()
-            self.user_sessions[user_id].add(session_id)
+            if user_id is not None:
+                self.bind_user(session_id, user_id)
             
             logger.info(f"WebSocket连接建立: session={session_id}, user={user_id}")
             
@@ -51,26 +84,50 @@ class WebSocketManager:
             logger.error(f"WebSocket连接失败: {e}")
             raise
     
-    async def disconnect(self, session_id: str):
-        """断开WebSocket连接"""
+    def bind_user(self, session_id: str, user_id: int):
+        """关联会话与用户"""
+        if self.session_to_user.get(session_id) == user_id:
+            return
+        
+        self._unbind_user(session_id)
+        if user_id not in self.user_sessions:
+            self.user_sessions[user_id] = set()
+        self.user_sessions[user_id].add(session_id)
+        self.session_to_user[session_id] = user_id
+    
+    def _unbind_user(self, session_id: str):
+        """解除会话与用户的关联"""
+        user_id = self.session_to_user.pop(session_id, None)
+        sessions = self.user_sessions.get(user_id)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:  # 如果用户没有其他会话，删除映射
+                del self.user_sessions[user_id]
+    
+    async def disconnect(self, session_id: str, websocket: Optional[WebSocket] = None):
+        """断开WebSocket连接（传入websocket时，只在会话当前的连接仍是该连接时断开，不影响重连后的新连接）"""
         try:
             if session_id in self.active_connections:
+                if websocket is not None and self.active_connections[session_id] is not websocket:
+                    return
                 websocket = self.active_connections[session_id]
                 
+                # 停止发送任务（由发送任务自身发起断开时不取消自己），丢弃未发送的消息
+                self.send_queues.pop(session_id, None)
+                send_task = self.send_tasks.pop(session_id, None)
+                if send_task is not None and send_task is not asyncio.current_task():
+                    send_task.cancel()
+                
                 try:
                     await websocket.close(code=1000, reason="正常断开")
                 except:
                     pass  # 忽略关闭时的错误
                 
                 del self.active_connections[session_id]
+                self._session_ids = tuple(self.active_connections)
                 
                 # 更新用户会话映射
-                for user_id, sessions in self.user_sessions.items():
-                    if session_id in sessions:
-                        sessions.remove(session_id)
-                        if not sessions:  # 如果用户没有其他会话，删除映射
-                            del self.user_sessions[user_id]
-                        break
+                self._unbind_user(session_id)
                 
                 # 清理状态回调
                 if session_id in self.status_callbacks:
@@ -82,49 +139,90 @@ class WebSocketManager:
             logger.error(f"断开WebSocket连接失败: {e}")
     
     async def send_to_session(self, session_id: str, message: Dict[str, Any]) -> bool:
-        """向指定会话发送消息"""
-        try:
-            if session_id not in self.active_connections:
-                logger.warning(f"会话不存在: {session_id}")
-                return False
-            
-            websocket = self.active_connections[session_id]
-            message_json = json.dumps(message, ensure_ascii=False, default=str)
-            
-            await websocket.send_text(message_json)
-            return True
-            
-        except WebSocketDisconnect:
-            logger.info(f"WebSocket连接已断开: {session_id}")
-            await self.disconnect(session_id)
-            return False
-        except Exception as e:
-            logger.error(f"发送WebSocket消息失败: {e}")
-            return False
+        """向指定会话发送消息（放入发送队列后立即返回）"""
+        message_json = self._serialize(message)
+        return await self._enqueue(session_id, message_json, self._drop_oldest(message))
     
     async def send_to_user(self, user_id: int, message: Dict[str, Any]) -> int:
         """向用户的所有会话发送消息"""
-        sent_count = 0
-        
-        if user_id in self.user_sessions:
-            sessions = self.user_sessions[user_id].copy()
-            for session_id in sessions:
-                if await self.send_to_session(session_id, message):
-                    sent_count += 1
-        
-        return sent_count
+        return await self._send_to_sessions(list(self.user_sessions.get(user_id, ())), message)
     
     async def broadcast_to_all(self, message: Dict[str, Any]) -> int:
         """向所有连接广播消息"""
-        sent_count = 0
+        return await self._send_to_sessions(self._session_ids, message)
+    
+    async def _send_to_sessions(self, session_ids: Sequence[str], message: Dict[str, Any]) -> int:
+        """向多个会话发送消息，返回成功放入队列的会话数（消息只序列化一次）"""
+        message_json = self._serialize(message)
+        drop_oldest = self._drop_oldest(message)
         
-        sessions = list(self.active_connections.keys())
-        for session_id in sessions:
-            if await self.send_to_session(session_id, message):
+        sent_count = 0
+        for session_id in session_ids:
+            if await self._enqueue(session_id, message_json, drop_oldest):
                 sent_count += 1
-        
         return sent_count
     
+    @staticmethod
+    def _serialize(message: Dict[str, Any]) -> str:
+        """序列化消息（前端按文本帧解析JSON，因此解码为字符串后用send_text发送）"""
+        return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    
+    @staticmethod
+    def _drop_oldest(message: Dict[str, Any]) -> bool:
+        """队列满时是否丢弃最旧消息（否则断开慢客户端）"""
+        return message.get("type") in DROP_OLDEST_MESSAGE_TYPES
+    
+    async def _enqueue(self, session_id: str, message_json: str, drop_oldest: bool = False) -> bool:
+        """将已序列化的消息放入会话的发送队列
+        
+        队列已满时，drop_oldest为True则丢弃最旧的一条消息后放入，否则断开慢客户端。
+        """
+        queue = self.send_queues.get(session_id)
+        if queue is None:
+            logger.warning(f"会话不存在: {session_id}")
+            return False
+        
+        try:
+            queue.put_nowait(message_json)
+            return True
+        except asyncio.QueueFull:
+            if drop_oldest:
+                queue.get_nowait()
+                queue.put_nowait(message_json)
+                logger.debug(f"WebSocket发送队列已满，丢弃最旧消息: {session_id}")
+                return True
+            logger.warning(f"WebSocket发送队列已满，断开慢客户端: {session_id}")
+            await self.disconnect(session_id)
+            return False
+    
+    async def _relay(self, session_id: str, websocket: WebSocket, queue: asyncio.Queue):
+        """连接的发送任务：取出队列中的消息写入网络
+        
+        队列中同时积压多条消息时合并为一个batch帧发送：{"type": "batch", "data": [...]}
+        """
+        while True:
+            batch = [await queue.get()]
+            while True:
+                try:
+                    batch.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            if len(batch) == 1:
+                message_json = batch[0]
+            else:
+                # 队列中的消息已是序列化后的JSON，直接拼接，无需重新序列化
+                message_json = '{"type":"batch","data":[' + ",".join(batch) + "]}"
+            try:
+                await asyncio.wait_for(websocket.send_text(message_json), SEND_TIMEOUT)
+            except Exception as e:
+                if isinstance(e, WebSocketDisconnect):
+                    logger.info(f"WebSocket连接已断开: {session_id}")
+                else:
+                    logger.warning(f"发送WebSocket消息失败，断开连接 {session_id}: {e!r}")
+                # 会话已重连到新的连接时不影响新连接
+                await self.disconnect(session_id, websocket)
+                return
+    
     def get_connection_count(self) -> int:
         """获取活跃连接数"""
         return len(self.active_connections)
@@ -148,7 +246,7 @@ class WebSocketManager:
             "data": {
                 "status": status,
                 "message": message,
-                "timestamp": asyncio.get_event_loop().time()
+                "timestamp": time.monotonic()
             }
         }
         
@@ -169,29 +267,34 @@ class WebSocketManager:
             if session_id in self.active_connections:
                 await self.send_to_session(session_id, {
                     "type": "pong",
-                    "data": {"timestamp": asyncio.get_event_loop().time()}
+                    "data": {"timestamp": time.monotonic()}
                 })
         except Exception as e:
             logger.error(f"心跳检测失败: {e}")
             await self.disconnect(session_id)
     
     async def cleanup_inactive_connections(self):
-        """清理非活跃连接"""
-        inactive_sessions = []
-        
-        for session_id, websocket in self.active_connections.items():
-            try:
-                # 发送ping消息测试连接
-                await websocket.ping()
-            except:
-                inactive_sessions.append(session_id)
+        """清理非活跃连接（并发ping所有连接）"""
+        results = await asyncio.gather(*(
+            self._ping(session_id, websocket)
+            for session_id, websocket in self.active_connections.items()
+        ))
+        inactive_sessions = [session_id for session_id in results if session_id]
         
         # 断开非活跃连接
-        for session_id in inactive_sessions:
-            await self.disconnect(session_id)
+        await asyncio.gather(*(self.disconnect(session_id) for session_id in inactive_sessions))
         
         if inactive_sessions:
             logger.info(f"清理了 {len(inactive_sessions)} 个非活跃连接")
+    
+    @staticmethod
+    async def _ping(session_id: str, websocket: WebSocket):
+        """发送ping消息测试连接，失败或超时时返回session_id"""
+        try:
+            await asyncio.wait_for(websocket.ping(), PING_TIMEOUT)
+            return None
+        except Exception:
+            return session_id
 
 
 # 创建全局WebSocket管理器实例
@@ -0,0 +1,201 @@
+"""对话记录后台写入器"""
+import asyncio
+import logging
+import orjson
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from app.core.database import SessionLocal
+from app.models.conversation import Conversation, ConversationSession
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 会话列表中最后一条消息的预览长度
+PREVIEW_LENGTH = 50
+
+
+class ConversationWriter:
+    """对话记录后台写入器
+    
+    消息写入队列后立即返回，后台任务按批量条数或等待时间攒批，
+    一次批量插入、一次提交，避免在回复链路上同步提交数据库。
+    同一事务中累加会话汇总表的消息数，会话列表无需再做COUNT聚合。
+    """
+    
+    def __init__(
+        self,
+        batch_size: int = settings.CONVERSATION_WRITE_BATCH_SIZE,
+        flush_interval: float = settings.CONVERSATION_WRITE_FLUSH_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止后台写入任务，等待队列中剩余的记录写完"""
+        if self._task is None:
+            return
+        
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        
+        self._task = None
+        self._queue = None
+    
+    def enqueue(
+        self,
+        user_id: int,
+        session_id: str,
+        message_type: str,
+        content: str,
+        round_number: int = 1,
+        context_data: Optional[Dict[str, Any]] = None,
+        extracted_elements: Optional[Dict[str, Any]] = None
+    ):
+        """加入待写入的对话记录"""
+        row = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "message_type": message_type,
+            "content": content,
+            "round_number": round_number,
+            "context_data": self._to_json_safe(context_data),
+            "extracted_elements": self._to_json_safe(extracted_elements),
+            # 按入队时间记录消息时间，不受后台攒批延迟影响
+            "created_at": datetime.now()
+        }
+        
+        if self._queue is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # 没有事件循环（如脚本中直接调用）时同步写入
+                self._write_rows([row])
+                return
+            
+            # 有事件循环但写入器尚未启动时按需启动，不在事件循环上同步提交
+            self.start()
+        
+        self._queue.put_nowait(row)
+    
+    @staticmethod
+    def _to_json_safe(value: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """将上下文数据转换为可JSON序列化的快照（无法序列化的值转为字符串）"""
+        if value is None:
+            return None
+        
+        return orjson.loads(orjson.dumps(
+            value,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ))
+    
+    async def _run(self):
+        """攒批并写入数据库"""
+        loop = asyncio.get_running_loop()
+        while True:
+            rows = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            
+            while len(rows) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await asyncio.to_thread(self._write_rows, rows)
+            except Exception as e:
+                logger.error("写入对话记录失败(%d条): %s", len(rows), e)
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+    
+    @classmethod
+    def _write_rows(cls, rows: List[Dict[str, Any]]):
+        """写入一批记录，整批失败时逐条重试，避免一条异常记录连累同批次其他用户的消息"""
+        try:
+            cls._write_batch(rows)
+            return
+        except Exception as e:
+            if len(rows) == 1:
+                raise
+            logger.warning("批量写入对话记录失败(%d条)，改为逐条写入: %s", len(rows), e)
+        
+        for row in rows:
+            try:
+                cls._write_batch([row])
+            except Exception as e:
+                logger.error("写入对话记录失败(会话%s): %s", row["session_id"], e)
+    
+    @staticmethod
+    def _write_batch(rows: List[Dict[str, Any]]):
+        """批量插入对话记录、更新会话汇总并提交一次"""
+        # 按会话合并本批次的消息数、最后一条消息（预览、时间、阶段）和第一条消息时间
+        session_updates: Dict[Tuple[int, str], List[Any]] = {}
+        for row in rows:
+            update = session_updates.setdefault(
+                (row["user_id"], row["session_id"]), [0, None, None, None, row["created_at"]]
+            )
+            update[0] += 1
+            update[1] = row["content"]
+            update[2] = row["created_at"]
+            context_data = row["context_data"]
+            update[3] = context_data.get("stage") if isinstance(context_data, dict) else None
+        
+        # 写入时截取预览，会话列表查询无需读取完整消息内容
+        for update in session_updates.values():
+            content = update[1]
+            update[1] = content[:PREVIEW_LENGTH] + "..." if len(content) > PREVIEW_LENGTH else content
+        
+        db = SessionLocal()
+        try:
+            db.execute(insert(Conversation), rows)
+            
+            for (user_id, session_id), (count, preview, last_time, stage, first_time) in session_updates.items():
+                updated = db.query(ConversationSession).filter(
+                    ConversationSession.user_id == user_id,
+                    ConversationSession.session_id == session_id
+                ).update({
+                    ConversationSession.message_count: ConversationSession.message_count + count,
+                    ConversationSession.last_message_preview: preview,
+                    ConversationSession.last_message_time: last_time,
+                    ConversationSession.current_stage: stage
+                }, synchronize_session=False)
+                
+                if not updated:
+                    db.add(ConversationSession(
+                        user_id=user_id,
+                        session_id=session_id,
+                        message_count=count,
+                        last_message_preview=preview,
+                        last_message_time=last_time,
+                        current_stage=stage,
+                        created_at=first_time
+                    ))
+            
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# 创建全局对话写入器实例
+conversation_writer = ConversationWriter()
@@ -1,15 +1,21 @@
 """核心模块"""
-from .database import engine, SessionLocal, get_db
-from .security import create_access_token, verify_token, get_password_hash, verify_password
-from .dependencies import get_current_user
+from .database import engine, SessionLocal, get_db, async_engine, AsyncSessionLocal, get_async_db
+from .security import create_access_token, verify_token, get_password_hash, get_password_hash_async, verify_password, verify_password_async
+from .dependencies import get_current_user, get_current_user_async
 
 __all__ = [
     "engine",
     "SessionLocal", 
     "get_db",
+    "async_engine",
+    "AsyncSessionLocal",
+    "get_async_db",
     "create_access_token",
     "verify_token",
     "get_password_hash",
+    "get_password_hash_async",
     "verify_password",
-    "get_current_user"
+    "verify_password_async",
+    "get_current_user",
+    "get_current_user_async"
 ]
@@ -1,21 +1,72 @@
 """数据库连接配置"""
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config.settings import settings
 
 
-# 创建数据库引擎
+# 同步驱动 -> 异步驱动
+ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite"
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """将同步数据库连接串转换为对应异步驱动的连接串"""
+    scheme, separator, rest = database_url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+
+# SQLite连接参数：WAL模式下读写互不阻塞，NORMAL同步级别在WAL下仍保证数据库一致
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256MB
+)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite连接建立时设置连接参数"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+# 创建数据库引擎（智能体工具、认证服务和对话记录写入器使用）
 engine = create_engine(
     settings.DATABASE_URL,
     echo=settings.DATABASE_ECHO,
-    pool_pre_ping=True,
+    pool_recycle=300,  # 定期回收连接代替每次借出时的pre-ping往返
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    query_cache_size=1200,  # 编译语句缓存容量（默认500），覆盖各路由的常用查询
+    # SQLite使用默认连接池，连接可在线程池线程中使用
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+)
+
+# 创建异步数据库引擎（查询等待数据库时释放事件循环）
+# 与同步引擎分摊连接数，两个连接池合计与原先单一连接池的上限相同
+async_engine = create_async_engine(
+    get_async_database_url(settings.DATABASE_URL),
+    echo=settings.DATABASE_ECHO,
     pool_recycle=300,
-    pool_size=10,
-    max_overflow=20,
-    poolclass=StaticPool if "sqlite" in settings.DATABASE_URL else None,
+    pool_size=settings.ASYNC_DATABASE_POOL_SIZE,
+    max_overflow=settings.ASYNC_DATABASE_MAX_OVERFLOW,
+    query_cache_size=1200,
+    poolclass=AsyncAdaptedQueuePool,  # aiosqlite默认不使用连接池，显式指定
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
 )
 
+if IS_SQLITE:
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -23,6 +74,14 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# 创建异步会话工厂
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 
 def get_db():
     """获取数据库会话"""
@@ -33,6 +92,12 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """初始化数据库"""
     from app.models import Base
@@ -2,8 +2,10 @@
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.core.security import decode_access_token
 from app.models.user import User
 
@@ -12,26 +14,28 @@ from app.models.user import User
 security = HTTPBearer()
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """获取当前用户"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    """令牌无效时的认证异常"""
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    # 解码令牌
+
+
+def _get_token_user_id(credentials: HTTPAuthorizationCredentials) -> int:
+    """解码令牌获取用户ID，令牌无效时抛出认证异常"""
     user_id = decode_access_token(credentials.credentials)
     if user_id is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
-    # 查询用户
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    return int(user_id)
+
+
+def _ensure_active_user(user: Optional[User]) -> User:
+    """校验用户存在且未被禁用"""
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     if not user.is_active:
         raise HTTPException(
@@ -42,6 +46,26 @@ async def get_current_user(
     return user
 
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """获取当前用户"""
+    user_id = _get_token_user_id(credentials)
+    user = db.query(User).filter(User.id == user_id).first()
+    return _ensure_active_user(user)
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """获取当前用户（异步会话，供使用异步会话的路由复用同一连接）"""
+    user_id = _get_token_user_id(credentials)
+    user = await db.scalar(select(User).where(User.id == user_id))
+    return _ensure_active_user(user)
+
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """获取当前活跃用户"""
     if not current_user.is_active:
@@ -1,5 +1,10 @@
 """安全认证模块"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -7,7 +12,41 @@ from config.settings import settings
 
 
 # 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+# 密码校验进程池（bcrypt为CPU密集型，放到独立进程中以利用多核），应用启动时创建
+_PASSWORD_POOL: Optional[ProcessPoolExecutor] = None
+
+# 用户不存在时用于校验的占位哈希，使响应耗时与用户存在时一致
+_DUMMY_PASSWORD_HASH: Optional[str] = None
+
+
+async def init_password_pool():
+    """创建密码校验进程池并预先计算占位哈希"""
+    global _PASSWORD_POOL, _DUMMY_PASSWORD_HASH
+    
+    if _PASSWORD_POOL is None:
+        _PASSWORD_POOL = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count()
+        )
+    
+    if _DUMMY_PASSWORD_HASH is None:
+        _DUMMY_PASSWORD_HASH = await asyncio.get_running_loop().run_in_executor(
+            _PASSWORD_POOL, get_password_hash, os.urandom(16).hex()
+        )
+
+
+def shutdown_password_pool():
+    """关闭密码校验进程池"""
+    global _PASSWORD_POOL
+    
+    if _PASSWORD_POOL is not None:
+        _PASSWORD_POOL.shutdown(wait=True, cancel_futures=True)
+        _PASSWORD_POOL = None
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -15,11 +54,34 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """在进程池中验证密码，hashed_password为空时校验占位哈希并返回False"""
+    # 未经应用启动流程（如脚本中调用）时按需创建进程池
+    if _PASSWORD_POOL is None or _DUMMY_PASSWORD_HASH is None:
+        await init_password_pool()
+    
+    target_hash = hashed_password if hashed_password is not None else _DUMMY_PASSWORD_HASH
+    verified = await asyncio.get_running_loop().run_in_executor(
+        _PASSWORD_POOL, verify_password, plain_password, target_hash
+    )
+    return verified and hashed_password is not None
+
+
 def get_password_hash(password: str) -> str:
     """生成密码哈希"""
     return pwd_context.hash(password)
 
 
+async def get_password_hash_async(password: str) -> str:
+    """在进程池中生成密码哈希"""
+    if _PASSWORD_POOL is None:
+        await init_password_pool()
+    
+    return await asyncio.get_running_loop().run_in_executor(
+        _PASSWORD_POOL, get_password_hash, password
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
     to_encode = data.copy()
@@ -33,13 +95,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+@lru_cache(maxsize=settings.TOKEN_CACHE_SIZE)
+def _decode_token(token: str, secret_key: str, algorithm: str) -> dict:
+    """解码并校验令牌签名（仅缓存成功结果，校验失败抛出的JWTError不会被缓存）
+    
+    密钥和算法作为缓存键的一部分，密钥轮换后旧的缓存结果自然失效。
+    """
+    return jwt.decode(token, secret_key, algorithms=[algorithm])
+
+
 def verify_token(token: str) -> Optional[dict]:
     """验证令牌"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        payload = _decode_token(token, settings.SECRET_KEY, settings.ALGORITHM)
     except JWTError:
         return None
+    
+    # 命中缓存时签名无需重新校验，但仍需检查是否已过期
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        return None
+    
+    return dict(payload)
 
 
 def decode_access_token(token: str) -> Optional[str]:
@@ -1,20 +1,26 @@
 """ETF数据服务"""
 from typing import List, Dict, Any, Optional
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
 from app.models.etf import ETFBasicInfo, ETFPriceData, ETFPerformanceMetrics
 from app.data.wind_service import WindService
 from app.cache.service import CacheService
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 缓存未命中时正在加载的任务，并发请求同一数据时只查询一次数据库/Wind
+_etf_list_loads: Dict[str, asyncio.Task] = {}
+_etf_detail_loads: Dict[str, asyncio.Task] = {}
+
 
 class ETFService:
     """ETF数据服务类"""
     
     def __init__(self, db: Session):
         self.db = db
-        self.wind_service = WindService()
         self.cache_service = CacheService()
     
     async def get_etf_list(self, asset_class: Optional[str] = None, 
@@ -31,47 +37,10 @@ class ETFService:
                 logger.info(f"从缓存获取ETF列表: {cache_key}")
                 return cached_data
             
-            # 从数据库查询
-            query = self.db.query(ETFBasicInfo)
-            
-            if asset_class:
-                query = query.filter(ETFBasicInfo.asset_class.like(f"%{asset_class}%"))
-            
-            if sector:
-                # 注意：删减后的模型没有sector字段，这里需要基于名称模糊匹配
-                query = query.filter(ETFBasicInfo.etf_name.like(f"%{sector}%"))
-            
-            query = query.filter(ETFBasicInfo.status == "active")
-            query = query.order_by(ETFBasicInfo.fund_scale.desc())
-            
-            etfs = query.limit(limit).all()
-            
-            # 转换为字典格式
-            etf_list = []
-            for etf in etfs:
-                etf_dict = {
-                    'id': etf.id,
-                    'etf_code': etf.etf_code,
-                    'etf_name': etf.etf_name,
-                    'full_name': etf.full_name,
-                    'asset_class': etf.asset_class,
-                    'investment_type': etf.investment_type,
-                    'fund_company': etf.fund_company,
-                    'listing_date': str(etf.listing_date) if etf.listing_date else None,
-                    'fund_scale': etf.fund_scale,
-                    'status': etf.status
-                }
-                etf_list.append(etf_dict)
-            
-            # 如果数据库为空，从Wind获取数据
-            if not etf_list:
-                logger.info("数据库ETF数据为空，从Wind获取")
-                etf_list = await self._sync_etf_data_from_wind(asset_class, sector, limit)
-            
-            # 缓存结果
-            await self.cache_service.set_etf_list(cache_key, etf_list)
-            
-            return etf_list
+            return await self._load_once(
+                _etf_list_loads, cache_key,
+                lambda: self._load_etf_list(cache_key, asset_class, sector, limit)
+            )
             
         except Exception as e:
             logger.error(f"获取ETF列表失败: {e}")
@@ -86,105 +55,137 @@ class ETFService:
                 logger.info(f"从缓存获取ETF详情: {etf_code}")
                 return cached_data
             
-            # 从数据库查询
-            etf = self.db.query(ETFBasicInfo).filter(ETFBasicInfo.etf_code == etf_code).first()
-            
-            if not etf:
-                # 从Wind同步数据
-                etf_info = await self._sync_single_etf_from_wind(etf_code)
-                if not etf_info:
-                    return None
-                etf = self.db.query(ETFBasicInfo).filter(ETFBasicInfo.etf_code == etf_code).first()
-            
-            if not etf:
-                return None
-            
-            # 获取Wind的实时绩效数据
-            performance_metrics = {}
-            try:
-                with self.wind_service:
-                    performance_metrics = self.wind_service.get_etf_performance_metrics(etf_code)
-            except Exception as e:
-                logger.warning(f"获取ETF绩效指标失败 {etf_code}: {e}")
-            
-            etf_detail = {
-                'id': etf.id,
-                'code': etf.code,
-                'name': etf.name,
-                'full_name': etf.full_name,
-                'asset_class': etf.asset_class,
-                'sector': etf.sector,
-                'region': etf.region,
-                'currency': etf.currency,
-                'nav': etf.nav,
-                'market_cap': etf.market_cap,
-                'expense_ratio': etf.expense_ratio,
-                'dividend_yield': etf.dividend_yield,
-                'volatility': etf.volatility,
-                'beta': etf.beta,
-                'sharpe_ratio': etf.sharpe_ratio,
-                'description': etf.description,
-                'investment_objective': etf.investment_objective,
-                'listing_date': etf.listing_date,
-                'status': etf.status,
-                'performance_metrics': performance_metrics
-            }
-            
-            # 缓存结果
-            await self.cache_service.set_etf_data(etf_code, etf_detail)
-            
-            return etf_detail
+            return await self._load_once(
+                _etf_detail_loads, etf_code,
+                lambda: self._load_etf_detail(etf_code)
+            )
             
         except Exception as e:
             logger.error(f"获取ETF详情失败 {etf_code}: {e}")
             return None
     
+    @staticmethod
+    async def _load_once(loads: Dict[str, asyncio.Task], key: str, load_factory):
+        """同一键同时只执行一次加载，其余调用方等待同一个加载任务的结果
+        
+        加载任务在不同请求间共享，因此加载过程不能使用发起请求的会话（self.db），
+        数据库操作均在各自的独立会话中执行，发起请求结束或被取消都不影响加载任务。
+        """
+        load = loads.get(key)
+        if load is None:
+            load = asyncio.ensure_future(load_factory())
+            loads[key] = load
+            load.add_done_callback(lambda _: loads.pop(key, None))
+        
+        # 单个调用方被取消时不影响其他等待同一加载任务的调用方
+        return await asyncio.shield(load)
+    
+    @staticmethod
+    async def _run_wind(query, *args):
+        """在线程中执行Wind查询，不阻塞事件循环
+        
+        Wind SDK为同步网络IO，每次查询在线程内使用独立的WindService连接，并发查询互不影响。
+        """
+        def run():
+            with WindService() as wind_service:
+                return query(wind_service, *args)
+        
+        return await asyncio.to_thread(run)
+    
+    async def _load_etf_list(self, cache_key: str, asset_class: Optional[str],
+                             sector: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """从数据库（为空时从Wind）加载ETF列表并写入缓存"""
+        # 从数据库查询（同步会话在线程中执行，不阻塞事件循环）
+        etf_list = await asyncio.to_thread(self._query_etf_list, asset_class, sector, limit)
+        
+        # 如果数据库为空，从Wind获取数据
+        if not etf_list:
+            logger.info("数据库ETF数据为空，从Wind获取")
+            etf_list = await self._sync_etf_data_from_wind(asset_class, sector, limit)
+        
+        # 缓存结果
+        await self.cache_service.set_etf_list(cache_key, etf_list)
+        
+        return etf_list
+    
+    async def _load_etf_detail(self, etf_code: str) -> Optional[Dict[str, Any]]:
+        """从数据库和Wind加载ETF详情并写入缓存"""
+        # 数据库查询与Wind实时绩效数据互不依赖，并发获取
+        etf, performance_metrics = await asyncio.gather(
+            asyncio.to_thread(self._get_etf_by_code, etf_code),
+            self._get_performance_metrics(etf_code)
+        )
+        
+        if not etf:
+            # 从Wind同步数据
+            etf_info = await self._sync_single_etf_from_wind(etf_code)
+            if not etf_info:
+                return None
+            etf = await asyncio.to_thread(self._get_etf_by_code, etf_code)
+        
+        if not etf:
+            return None
+        
+        etf_detail = {
+            'id': etf.id,
+            'code': etf.code,
+            'name': etf.name,
+            'full_name': etf.full_name,
+            'asset_class': etf.asset_class,
+            'sector': etf.sector,
+            'region': etf.region,
+            'currency': etf.currency,
+            'nav': etf.nav,
+            'market_cap': etf.market_cap,
+            'expense_ratio': etf.expense_ratio,
+            'dividend_yield': etf.dividend_yield,
+            'volatility': etf.volatility,
+            'beta': etf.beta,
+            'sharpe_ratio': etf.sharpe_ratio,
+            'description': etf.description,
+            'investment_objective': etf.investment_objective,
+            'listing_date': etf.listing_date,
+            'status': etf.status,
+            'performance_metrics': performance_metrics
+        }
+        
+        # 缓存结果
+        await self.cache_service.set_etf_data(etf_code, etf_detail)
+        
+        return etf_detail
+    
+    async def _get_performance_metrics(self, etf_code: str) -> Dict[str, Any]:
+        """获取Wind的实时绩效数据（失败时返回空字典）"""
+        try:
+            return await self._run_wind(WindService.get_etf_performance_metrics, etf_code)
+        except Exception as e:
+            logger.warning(f"获取ETF绩效指标失败 {etf_code}: {e}")
+            return {}
+    
     async def search_etf(self, keyword: str, limit: int = 20) -> List[Dict[str, Any]]:
         """搜索ETF"""
         try:
             # 从数据库搜索
-            query = self.db.query(ETFBasicInfo).filter(
-                (ETFBasicInfo.etf_name.like(f"%{keyword}%")) |
-                (ETFBasicInfo.full_name.like(f"%{keyword}%")) |
-                (ETFBasicInfo.asset_class.like(f"%{keyword}%"))
-            )
-            
-            query = query.filter(ETFBasicInfo.status == "active")
-            query = query.order_by(ETFBasicInfo.fund_scale.desc())
-            
-            etfs = query.limit(limit).all()
-            
-            etf_list = []
-            for etf in etfs:
-                etf_dict = {
-                    'id': etf.id,
-                    'code': etf.code,
-                    'name': etf.name,
-                    'full_name': etf.full_name,
-                    'asset_class': etf.asset_class,
-                    'sector': etf.sector,
-                    'nav': etf.nav,
-                    'market_cap': etf.market_cap
-                }
-                etf_list.append(etf_dict)
+            etf_list = await asyncio.to_thread(self._search_etf_in_db, keyword, limit)
             
             # 如果数据库搜索结果不足，从Wind补充搜索
             if len(etf_list) < limit:
                 try:
-                    with self.wind_service:
-                        wind_results = self.wind_service.search_etf_by_keyword(keyword, limit)
-                        # 合并结果并去重
-                        existing_codes = {etf['code'] for etf in etf_list}
-                        for wind_etf in wind_results:
-                            if wind_etf['code'] not in existing_codes:
-                                etf_list.append({
-                                    'code': wind_etf['code'],
-                                    'name': wind_etf['name'],
-                                    'full_name': wind_etf.get('full_name', ''),
-                                    'asset_class': wind_etf.get('industry', ''),
-                                    'sector': wind_etf.get('sector', ''),
-                                    'listing_date': wind_etf.get('listing_date', '')
-                                })
+                    wind_results = await self._run_wind(
+                        WindService.search_etf_by_keyword, keyword, limit
+                    )
+                    # 合并结果并去重
+                    existing_codes = {etf['code'] for etf in etf_list}
+                    for wind_etf in wind_results:
+                        if wind_etf['code'] not in existing_codes:
+                            etf_list.append({
+                                'code': wind_etf['code'],
+                                'name': wind_etf['name'],
+                                'full_name': wind_etf.get('full_name', ''),
+                                'asset_class': wind_etf.get('industry', ''),
+                                'sector': wind_etf.get('sector', ''),
+                                'listing_date': wind_etf.get('listing_date', '')
+                            })
                 except Exception as e:
                     logger.warning(f"Wind搜索ETF失败: {e}")
             
@@ -194,6 +195,73 @@ class ETFService:
             logger.error(f"搜索ETF失败 {keyword}: {e}")
             return []
     
+    def _query_etf_list(self, asset_class: Optional[str], sector: Optional[str],
+                        limit: int) -> List[Dict[str, Any]]:
+        """从数据库查询ETF列表（只查询所需列，不构造ORM对象）
+        
+        在工作线程中执行，使用独立的会话（Session不是线程安全的，不能与请求会话共用）。
+        """
+        stmt = select(
+            ETFBasicInfo.id,
+            ETFBasicInfo.etf_code,
+            ETFBasicInfo.etf_name,
+            ETFBasicInfo.full_name,
+            ETFBasicInfo.asset_class,
+            ETFBasicInfo.investment_type,
+            ETFBasicInfo.fund_company,
+            ETFBasicInfo.listing_date,
+            ETFBasicInfo.fund_scale,
+            ETFBasicInfo.status
+        )
+        
+        if asset_class:
+            stmt = stmt.where(ETFBasicInfo.asset_class.like(f"%{asset_class}%"))
+        
+        if sector:
+            # 注意：删减后的模型没有sector字段，这里需要基于名称模糊匹配
+            stmt = stmt.where(ETFBasicInfo.etf_name.like(f"%{sector}%"))
+        
+        stmt = stmt.where(ETFBasicInfo.status == "active")
+        stmt = stmt.order_by(ETFBasicInfo.fund_scale.desc()).limit(limit)
+        
+        etf_list = []
+        with SessionLocal() as db:
+            for row in db.execute(stmt).mappings():
+                etf_dict = dict(row)
+                etf_dict['listing_date'] = str(row['listing_date']) if row['listing_date'] else None
+                etf_list.append(etf_dict)
+        
+        return etf_list
+    
+    def _get_etf_by_code(self, etf_code: str) -> Optional[ETFBasicInfo]:
+        """根据代码查询ETF
+        
+        在工作线程中与其他查询并发执行，使用独立的会话；返回的对象已脱离会话，属性在查询时已加载。
+        """
+        with SessionLocal() as db:
+            return db.query(ETFBasicInfo).filter(ETFBasicInfo.etf_code == etf_code).first()
+    
+    def _search_etf_in_db(self, keyword: str, limit: int) -> List[Dict[str, Any]]:
+        """从数据库搜索ETF（只查询所需列，不构造ORM对象，在工作线程中使用独立的会话）"""
+        stmt = select(
+            ETFBasicInfo.id,
+            ETFBasicInfo.etf_code.label('code'),
+            ETFBasicInfo.etf_name.label('name'),
+            ETFBasicInfo.full_name,
+            ETFBasicInfo.asset_class,
+            ETFBasicInfo.fund_scale
+        ).where(
+            (ETFBasicInfo.etf_name.like(f"%{keyword}%")) |
+            (ETFBasicInfo.full_name.like(f"%{keyword}%")) |
+            (ETFBasicInfo.asset_class.like(f"%{keyword}%"))
+        )
+        
+        stmt = stmt.where(ETFBasicInfo.status == "active")
+        stmt = stmt.order_by(ETFBasicInfo.fund_scale.desc()).limit(limit)
+        
+        with SessionLocal() as db:
+            return [dict(row) for row in db.execute(stmt).mappings()]
+    
     async def get_etf_price_history(self, etf_code: str, 
                                    days: int = 365) -> List[Dict[str, Any]]:
         """获取ETF价格历史"""
@@ -203,8 +271,9 @@ class ETFService:
             end_date = datetime.now().strftime('%Y%m%d')
             start_date = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
             
-            with self.wind_service:
-                price_data = self.wind_service.get_etf_price_data(etf_code, start_date, end_date)
+            price_data = await self._run_wind(
+                WindService.get_etf_price_data, etf_code, start_date, end_date
+            )
             
             return price_data
             
@@ -217,86 +286,110 @@ class ETFService:
                                      limit: int = 50) -> List[Dict[str, Any]]:
         """从Wind同步ETF数据"""
         try:
-            with self.wind_service:
-                wind_etfs = self.wind_service.get_etf_list(asset_class, sector)
-            
-            etf_list = []
-            for wind_etf in wind_etfs[:limit]:
-                # 检查数据库中是否已存在
-                existing_etf = self.db.query(ETFBasicInfo).filter(
-                    ETFBasicInfo.etf_code == wind_etf['code']
-                ).first()
-                
-                if not existing_etf:
-                    # 创建新的ETF记录
-                    new_etf = ETFBasicInfo(
-                        etf_code=wind_etf['code'],
-                        etf_name=wind_etf['name'],
-                        full_name=wind_etf.get('full_name', ''),
-                        asset_class=wind_etf.get('industry', ''),
-                        investment_type=wind_etf.get('investment_type', ''),
-                        listing_date=wind_etf.get('listing_date', ''),
-                        status='active'
-                    )
-                    
-                    self.db.add(new_etf)
-                    existing_etf = new_etf
-                
-                etf_dict = {
-                    'code': existing_etf.code,
-                    'name': existing_etf.name,
-                    'full_name': existing_etf.full_name,
-                    'asset_class': existing_etf.asset_class,
-                    'sector': existing_etf.sector,
-                    'listing_date': existing_etf.listing_date
-                }
-                etf_list.append(etf_dict)
+            wind_etfs = await self._run_wind(WindService.get_etf_list, asset_class, sector)
             
-            self.db.commit()
+            etf_list = await asyncio.to_thread(self._save_wind_etfs, wind_etfs[:limit])
             logger.info(f"从Wind同步了 {len(etf_list)} 个ETF")
             
             return etf_list
             
         except Exception as e:
             logger.error(f"从Wind同步ETF数据失败: {e}")
-            self.db.rollback()
             return []
     
+    def _save_wind_etfs(self, wind_etfs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """将Wind的ETF写入数据库（新ETF一次批量插入），返回ETF信息列表
+        
+        在工作线程中执行，使用独立的会话（Session不是线程安全的，不能与请求会话共用）。
+        """
+        with SessionLocal() as db:
+            try:
+                # 一次查询出已存在的ETF代码
+                codes = [wind_etf['code'] for wind_etf in wind_etfs]
+                existing_codes = {
+                    code for (code,) in db.query(ETFBasicInfo.etf_code).filter(
+                        ETFBasicInfo.etf_code.in_(codes)
+                    )
+                }
+                
+                etf_list = []
+                new_rows = []
+                for wind_etf in wind_etfs:
+                    if wind_etf['code'] not in existing_codes:
+                        existing_codes.add(wind_etf['code'])  # Wind结果中的重复代码只插入一次
+                        new_rows.append({
+                            'etf_code': wind_etf['code'],
+                            'etf_name': wind_etf['name'],
+                            'full_name': wind_etf.get('full_name', ''),
+                            'asset_class': wind_etf.get('industry', ''),
+                            'investment_type': wind_etf.get('investment_type', ''),
+                            'listing_date': wind_etf.get('listing_date') or None,
+                            'status': 'active'
+                        })
+                    
+                    etf_list.append({
+                        'code': wind_etf['code'],
+                        'name': wind_etf['name'],
+                        'full_name': wind_etf.get('full_name', ''),
+                        'asset_class': wind_etf.get('industry', ''),
+                        'sector': wind_etf.get('sector', ''),
+                        'listing_date': wind_etf.get('listing_date', '')
+                    })
+                
+                if new_rows:
+                    db.execute(insert(ETFBasicInfo), new_rows)
+                db.commit()
+                
+                return etf_list
+                
+            except Exception:
+                db.rollback()
+                raise
+    
     async def _sync_single_etf_from_wind(self, etf_code: str) -> Optional[Dict[str, Any]]:
         """从Wind同步单个ETF数据"""
         try:
-            with self.wind_service:
-                wind_etf = self.wind_service.get_etf_basic_info(etf_code)
+            wind_etf = await self._run_wind(WindService.get_etf_basic_info, etf_code)
             
             if not wind_etf:
                 return None
             
-            # 创建新的ETF记录
-            new_etf = ETFBasicInfo(
-                etf_code=wind_etf['code'],
-                etf_name=wind_etf['name'],
-                full_name=wind_etf.get('full_name', ''),
-                asset_class=wind_etf.get('industry', ''),
-                investment_type=wind_etf.get('investment_type', ''),
-                listing_date=wind_etf.get('listing_date', ''),
-                status='active'
-            )
-            
-            self.db.add(new_etf)
-            self.db.commit()
-            
+            etf_info = await asyncio.to_thread(self._save_wind_etf, wind_etf)
             logger.info(f"从Wind同步ETF: {etf_code}")
             
-            return {
-                'code': new_etf.code,
-                'name': new_etf.name,
-                'full_name': new_etf.full_name,
-                'asset_class': new_etf.asset_class,
-                'sector': new_etf.sector,
-                'listing_date': new_etf.listing_date
-            }
+            return etf_info
             
         except Exception as e:
             logger.error(f"从Wind同步ETF失败 {etf_code}: {e}")
-            self.db.rollback()
             return None
+    
+    def _save_wind_etf(self, wind_etf: Dict[str, Any]) -> Dict[str, Any]:
+        """将Wind的单个ETF写入数据库（在工作线程中使用独立的会话），返回ETF信息"""
+        with SessionLocal() as db:
+            try:
+                # 创建新的ETF记录
+                new_etf = ETFBasicInfo(
+                    etf_code=wind_etf['code'],
+                    etf_name=wind_etf['name'],
+                    full_name=wind_etf.get('full_name', ''),
+                    asset_class=wind_etf.get('industry', ''),
+                    investment_type=wind_etf.get('investment_type', ''),
+                    listing_date=wind_etf.get('listing_date') or None,
+                    status='active'
+                )
+                
+                db.add(new_etf)
+                db.commit()
+                
+            except Exception:
+                db.rollback()
+                raise
+        
+        return {
+            'code': wind_etf['code'],
+            'name': wind_etf['name'],
+            'full_name': wind_etf.get('full_name', ''),
+            'asset_class': wind_etf.get('industry', ''),
+            'sector': wind_etf.get('sector', ''),
+            'listing_date': wind_etf.get('listing_date', '')
+        }
@@ -1,13 +1,65 @@
 """市场资讯服务"""
 import aiohttp
 import asyncio
-from typing import List, Dict, Any, Optional
+import functools
+import hashlib
+import inspect
+import orjson
+import re
+from typing import List, Dict, Any, Optional, Sequence, Callable, Awaitable
 from datetime import datetime, timedelta
+from app.cache.service import cache_service
 from config.settings import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 标题去重前去除空白、标点和下划线
+_TITLE_NOISE_RE = re.compile(r'[\s\W_]+')
+
+# 行业 -> 行业新闻搜索关键词
+_SECTOR_KEYWORDS = {
+    '科技': ('科技', '人工智能', '芯片', '5G', '互联网'),
+    '医药': ('医药', '生物', '疫苗', '医疗', '健康'),
+    '新能源': ('新能源', '电池', '光伏', '风电', '储能'),
+    '消费': ('消费', '零售', '品牌', '食品', '饮料'),
+    '金融': ('银行', '保险', '证券', '金融科技', '支付'),
+    '地产': ('房地产', '建筑', '基建', '城市化', '土地')
+}
+
+
+def cache_result(prefix: str, ttl: int):
+    """将资讯方法的结果缓存到Redis
+    
+    缓存键由方法名前缀和规范化后的调用参数生成，空结果（请求失败时的返回值）不缓存。
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = {name: value for name, value in bound.arguments.items() if name != "self"}
+            digest = hashlib.blake2b(
+                orjson.dumps(params, option=orjson.OPT_SORT_KEYS, default=str),
+                digest_size=16
+            ).hexdigest()
+            key = f"news:{prefix}:{digest}"
+            
+            cached = await cache_service.get_cache(key)
+            if cached is not None:
+                return cached
+            
+            result = await func(self, *args, **kwargs)
+            if result:
+                await cache_service.set_cache(key, result, ttl)
+            return result
+        
+        return wrapper
+    
+    return decorator
+
 
 class NewsService:
     """市场资讯服务类"""
@@ -15,17 +67,60 @@ class NewsService:
     def __init__(self):
         self.timeout = aiohttp.ClientTimeout(total=settings.NEWS_API_TIMEOUT)
         self.session = None
+        # HTTP会话所属的事件循环
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def startup(self):
+        """创建HTTP会话（应用启动时调用，整个应用生命周期内复用连接池和keep-alive连接）"""
+        if self.session is None or self.session.closed:
+            self._loop = asyncio.get_running_loop()
+            self.session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(
+                    limit=settings.NEWS_API_POOL_SIZE,
+                    limit_per_host=settings.NEWS_API_POOL_SIZE_PER_HOST,
+                    ttl_dns_cache=settings.NEWS_API_DNS_CACHE_TTL
+                )
+            )
+    
+    async def shutdown(self):
+        """关闭HTTP会话（应用关闭时调用）"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
     
     async def __aenter__(self):
-        """异步上下文管理器入口"""
-        self.session = aiohttp.ClientSession(timeout=self.timeout)
+        """异步上下文管理器入口（在独立事件循环中使用，如Celery任务）"""
+        await self.startup()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器出口"""
-        if self.session:
-            await self.session.close()
+        await self.shutdown()
+    
+    def run_sync(self, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """在同步代码中执行资讯请求
+        
+        HTTP会话所属的事件循环正在运行时（同步代码在其他线程中执行）提交到该事件循环，复用应用的连接池；
+        否则（如Celery进程中）在新的事件循环中执行，结束时关闭本次创建的会话。
+        """
+        loop = self._loop
+        if self.session is not None and not self.session.closed and loop is not None and loop.is_running():
+            return asyncio.run_coroutine_threadsafe(fetch(), loop).result()
+        
+        async def run():
+            async with self:
+                return await fetch()
+        
+        return asyncio.run(run())
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取HTTP会话（未经startup时按需创建）"""
+        if self.session is None or self.session.closed:
+            await self.startup()
+        return self.session
     
+    @cache_result("financial", settings.CACHE_TTL_NEWS_LIST)
     async def get_financial_news(self, category: str = "finance", 
                                limit: int = 20) -> List[Dict[str, Any]]:
         """获取财经新闻"""
@@ -40,16 +135,14 @@ class NewsService:
                 'format': 'json'
             }
             
-            if not self.session:
-                self.session = aiohttp.ClientSession(timeout=self.timeout)
-            
-            async with self.session.get(
+            session = await self._get_session()
+            async with session.get(
                 url, 
                 params=params, 
                 headers=sina_config['headers']
             ) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await response.json(loads=orjson.loads)
                     return self._format_sina_news(data)
                 else:
                     logger.warning(f"新浪财经API返回状态码: {response.status}")
@@ -59,15 +152,28 @@ class NewsService:
             logger.error(f"获取新浪财经新闻失败: {e}")
             return []
     
-    async def get_etf_related_news(self, keywords: List[str], 
+    async def get_etf_related_news(self, keywords: Sequence[str], 
                                   limit: int = 10) -> List[Dict[str, Any]]:
         """获取ETF相关新闻"""
         try:
-            news_list = []
+            if not keywords:
+                return []
+            
+            # 并发搜索前先创建会话，所有请求共用同一个连接池
+            await self._get_session()
             
-            for keyword in keywords:
-                # 搜索包含关键词的新闻
-                keyword_news = await self.search_news(keyword, limit//len(keywords) + 1)
+            # 并发搜索各关键词的新闻，单个关键词失败不影响其他结果
+            per_keyword_limit = limit // len(keywords) + 1
+            results = await asyncio.gather(
+                *(self.search_news(keyword, per_keyword_limit) for keyword in keywords),
+                return_exceptions=True
+            )
+            
+            news_list = []
+            for keyword, keyword_news in zip(keywords, results):
+                if isinstance(keyword_news, Exception):
+                    logger.warning(f"搜索新闻失败 {keyword}: {keyword_news}")
+                    continue
                 news_list.extend(keyword_news)
             
             # 去重并按时间排序
@@ -82,6 +188,7 @@ class NewsService:
             logger.error(f"获取ETF相关新闻失败: {e}")
             return []
     
+    @cache_result("search", settings.CACHE_TTL_NEWS_LIST)
     async def search_news(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
         """搜索新闻"""
         try:
@@ -95,16 +202,14 @@ class NewsService:
                 'type': 'finance'
             }
             
-            if not self.session:
-                self.session = aiohttp.ClientSession(timeout=self.timeout)
-            
-            async with self.session.get(
+            session = await self._get_session()
+            async with session.get(
                 url, 
                 params=params, 
                 headers=eastmoney_config['headers']
             ) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await response.json(loads=orjson.loads)
                     return self._format_eastmoney_news(data)
                 else:
                     logger.warning(f"东方财富API返回状态码: {response.status}")
@@ -114,6 +219,7 @@ class NewsService:
             logger.error(f"搜索新闻失败 {keyword}: {e}")
             return []
     
+    @cache_result("sentiment", settings.CACHE_TTL_MARKET_SENTIMENT)
     async def get_market_sentiment(self) -> Dict[str, Any]:
         """获取市场情绪指标"""
         try:
@@ -137,16 +243,7 @@ class NewsService:
     async def get_sector_news(self, sector: str, limit: int = 10) -> List[Dict[str, Any]]:
         """获取行业新闻"""
         try:
-            sector_keywords = {
-                '科技': ['科技', '人工智能', '芯片', '5G', '互联网'],
-                '医药': ['医药', '生物', '疫苗', '医疗', '健康'],
-                '新能源': ['新能源', '电池', '光伏', '风电', '储能'],
-                '消费': ['消费', '零售', '品牌', '食品', '饮料'],
-                '金融': ['银行', '保险', '证券', '金融科技', '支付'],
-                '地产': ['房地产', '建筑', '基建', '城市化', '土地']
-            }
-            
-            keywords = sector_keywords.get(sector, [sector])
+            keywords = _SECTOR_KEYWORDS.get(sector, (sector,))
             news_list = await self.get_etf_related_news(keywords, limit)
             
             return news_list
@@ -155,6 +252,7 @@ class NewsService:
             logger.error(f"获取行业新闻失败 {sector}: {e}")
             return []
     
+    @cache_result("reports", settings.CACHE_TTL_NEWS)
     async def get_research_reports(self, asset_class: str = None, 
                                  limit: int = 10) -> List[Dict[str, Any]]:
         """获取研究报告"""
@@ -183,11 +281,10 @@ class NewsService:
     def _format_sina_news(self, data: dict) -> List[Dict[str, Any]]:
         """格式化新浪财经新闻数据"""
         try:
-            news_list = []
             items = data.get('data', {}).get('items', [])
             
-            for item in items:
-                news_item = {
+            return [
+                {
                     'title': item.get('title', ''),
                     'summary': item.get('summary', ''),
                     'url': item.get('url', ''),
@@ -196,9 +293,8 @@ class NewsService:
                     'category': item.get('category', 'finance'),
                     'keywords': item.get('keywords', [])
                 }
-                news_list.append(news_item)
-            
-            return news_list
+                for item in items
+            ]
             
         except Exception as e:
             logger.error(f"格式化新浪新闻数据失败: {e}")
@@ -207,11 +303,10 @@ class NewsService:
     def _format_eastmoney_news(self, data: dict) -> List[Dict[str, Any]]:
         """格式化东方财富新闻数据"""
         try:
-            news_list = []
             items = data.get('result', [])
             
-            for item in items:
-                news_item = {
+            return [
+                {
                     'title': item.get('title', ''),
                     'summary': item.get('content', '')[:200],
                     'url': item.get('url', ''),
@@ -220,9 +315,8 @@ class NewsService:
                     'category': 'finance',
                     'keywords': []
                 }
-                news_list.append(news_item)
-            
-            return news_list
+                for item in items
+            ]
             
         except Exception as e:
             logger.error(f"格式化东方财富新闻数据失败: {e}")
@@ -230,17 +324,23 @@ class NewsService:
     
     def _deduplicate_news(self, news_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """新闻去重"""
+        # 按规范化标题（小写、去除空白和标点）的哈希值去重，仅空白或标点不同的标题视为重复
         seen_titles = set()
         unique_news = []
         
         for news in news_list:
             title = news.get('title', '')
-            if title and title not in seen_titles:
-                seen_titles.add(title)
+            if not title:
+                continue
+            
+            title_hash = hash(_TITLE_NOISE_RE.sub('', title.lower()))
+            if title_hash not in seen_titles:
+                seen_titles.add(title_hash)
                 unique_news.append(news)
         
         return unique_news
     
+    @cache_result("hot_topics", settings.CACHE_TTL_MARKET_SENTIMENT)
     async def get_hot_topics(self, limit: int = 10) -> List[Dict[str, Any]]:
         """获取热门话题"""
         try:
@@ -1,5 +1,8 @@
 """Wind数据库服务"""
+import asyncio
+import queue
 import pyodbc
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Optional, Any
 from datetime import datetime, timedelta
@@ -8,6 +11,63 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 计算夏普比率使用的无风险利率
+RISK_FREE_RATE = 0.03
+
+# 按代码批量查询时单条SQL的代码数上限（SQL Server单条语句最多2100个参数）
+QUERY_BATCH_SIZE = 500
+
+# Wind连接池：进程内所有WindService实例共用，归还的连接供后续查询复用，避免每次查询重新建立ODBC连接
+_connection_pool: queue.LifoQueue = queue.LifoQueue(maxsize=settings.WIND_POOL_SIZE)
+
+
+def _acquire_connection(connection_string: str) -> pyodbc.Connection:
+    """从连接池取出一个连接，连接池为空时新建连接"""
+    try:
+        return _connection_pool.get_nowait()
+    except queue.Empty:
+        connection = pyodbc.connect(connection_string)
+        logger.info("Wind数据库连接成功")
+        return connection
+
+
+def _release_connection(connection: pyodbc.Connection):
+    """将连接归还连接池，连接池已满时关闭连接"""
+    try:
+        _connection_pool.put_nowait(connection)
+    except queue.Full:
+        connection.close()
+
+
+def calculate_performance_metrics(close: np.ndarray, period_days: int) -> Dict[str, Any]:
+    """根据按交易日排序的收盘价序列计算绩效指标（NumPy向量化计算）"""
+    daily_return = np.diff(close) / close[:-1]
+    
+    total_return = (close[-1] / close[0] - 1) * 100
+    annual_return = ((1 + total_return/100) ** (365/period_days) - 1) * 100
+    volatility = daily_return.std(ddof=1) * (252 ** 0.5) * 100 if daily_return.size > 1 else float('nan')
+    
+    # 计算最大回撤
+    if daily_return.size:
+        cumulative_returns = np.cumprod(1 + daily_return)
+        running_max = np.maximum.accumulate(cumulative_returns)
+        max_drawdown = ((cumulative_returns - running_max) / running_max).min() * 100
+    else:
+        max_drawdown = float('nan')
+    
+    # 计算夏普比率
+    excess_return = annual_return/100 - RISK_FREE_RATE
+    sharpe_ratio = excess_return / (volatility/100) if volatility > 0 else 0
+    
+    return {
+        'total_return': round(float(total_return), 2),
+        'annual_return': round(float(annual_return), 2),
+        'volatility': round(float(volatility), 2),
+        'max_drawdown': round(float(max_drawdown), 2),
+        'sharpe_ratio': round(float(sharpe_ratio), 2),
+        'period_days': period_days
+    }
+
 
 class WindService:
     """Wind数据库服务类"""
@@ -17,34 +77,57 @@ class WindService:
         self.connection = None
     
     def connect(self):
-        """连接Wind数据库"""
+        """连接Wind数据库（从连接池取出连接，由本实例独占至disconnect）"""
+        if self.connection:
+            return
+        
         try:
-            self.connection = pyodbc.connect(self.connection_string)
-            logger.info("Wind数据库连接成功")
+            self.connection = _acquire_connection(self.connection_string)
         except Exception as e:
             logger.error(f"Wind数据库连接失败: {e}")
             raise
     
     def disconnect(self):
-        """断开数据库连接"""
+        """断开数据库连接（连接归还连接池）"""
         if self.connection:
-            self.connection.close()
+            _release_connection(self.connection)
             self.connection = None
-            logger.info("Wind数据库连接已断开")
     
     def execute_query(self, query: str, params: tuple = None) -> pd.DataFrame:
-        """执行SQL查询"""
+        """执行SQL查询（未调用connect时从连接池借用连接，查询结束即归还）"""
+        borrowed = not self.connection
+        if borrowed:
+            self.connect()
+        
+        connection = self.connection
         try:
-            if not self.connection:
-                self.connect()
+            # 直接用游标一次取回全部行并按列构造DataFrame，
+            # 避免pd.read_sql对非SQLAlchemy连接的兼容处理和逐行转换
+            cursor = connection.cursor()
+            try:
+                cursor.execute(query, params or ())
+                columns = [column[0] for column in cursor.description]
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
             
-            df = pd.read_sql(query, self.connection, params=params)
-            return df
+            return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
             
         except Exception as e:
             logger.error(f"查询执行失败: {e}")
             logger.error(f"查询语句: {query}")
+            if isinstance(e, pyodbc.Error):
+                # 连接可能已失效，关闭而不归还连接池
+                self.connection = None
+                connection.close()
             raise
+        finally:
+            if borrowed:
+                self.disconnect()
+    
+    async def execute_query_async(self, query: str, params: tuple = None) -> pd.DataFrame:
+        """在线程中执行SQL查询，不阻塞事件循环（每次查询借用独立的连接，可并发执行）"""
+        return await asyncio.to_thread(WindService().execute_query, query, params)
     
     def get_etf_list(self, asset_class: Optional[str] = None, 
                     sector: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -121,6 +204,36 @@ class WindService:
         df = self.execute_query(query, (etf_code, start_date, end_date))
         return df.to_dict('records')
     
+    def get_etf_price_data_bulk(self, etf_codes: List[str], start_date: str,
+                                end_date: str) -> Dict[str, List[Dict[str, Any]]]:
+        """批量获取多只ETF的价格数据（每批代码一次查询），返回 代码 -> 按交易日排序的价格数据"""
+        price_data = {}
+        for i in range(0, len(etf_codes), QUERY_BATCH_SIZE):
+            batch = etf_codes[i:i + QUERY_BATCH_SIZE]
+            query = f"""
+            SELECT 
+                S_INFO_WINDCODE as code,
+                TRADE_DT as trade_date,
+                S_DQ_CLOSE as close_price,
+                S_DQ_OPEN as open_price,
+                S_DQ_HIGH as high_price,
+                S_DQ_LOW as low_price,
+                S_DQ_VOLUME as volume,
+                S_DQ_AMOUNT as amount,
+                S_DQ_PCTCHANGE as pct_change
+            FROM ASHAREEODPRICES 
+            WHERE S_INFO_WINDCODE IN ({','.join('?' * len(batch))})
+            AND TRADE_DT >= ?
+            AND TRADE_DT <= ?
+            ORDER BY S_INFO_WINDCODE, TRADE_DT
+            """
+            
+            df = self.execute_query(query, (*batch, start_date, end_date))
+            for code, group in df.groupby('code', sort=False):
+                price_data[code] = group.drop(columns='code').to_dict('records')
+        
+        return price_data
+    
     def get_etf_nav_data(self, etf_code: str, start_date: str, 
                         end_date: str) -> List[Dict[str, Any]]:
         """获取ETF净值数据"""
@@ -192,37 +305,9 @@ class WindService:
         if not price_data:
             return {}
         
-        df = pd.DataFrame(price_data)
-        df['trade_date'] = pd.to_datetime(df['trade_date'])
-        df = df.sort_values('trade_date')
-        
-        # 计算收益率
-        df['daily_return'] = df['close_price'].pct_change()
-        
-        # 计算绩效指标
-        total_return = (df['close_price'].iloc[-1] / df['close_price'].iloc[0] - 1) * 100
-        annual_return = ((1 + total_return/100) ** (365/period_days) - 1) * 100
-        volatility = df['daily_return'].std() * (252 ** 0.5) * 100
-        
-        # 计算最大回撤
-        cumulative_returns = (1 + df['daily_return']).cumprod()
-        running_max = cumulative_returns.expanding().max()
-        drawdown = (cumulative_returns - running_max) / running_max
-        max_drawdown = drawdown.min() * 100
-        
-        # 计算夏普比率（假设无风险利率为3%）
-        risk_free_rate = 0.03
-        excess_return = annual_return/100 - risk_free_rate
-        sharpe_ratio = excess_return / (volatility/100) if volatility > 0 else 0
-        
-        return {
-            'total_return': round(total_return, 2),
-            'annual_return': round(annual_return, 2),
-            'volatility': round(volatility, 2),
-            'max_drawdown': round(max_drawdown, 2),
-            'sharpe_ratio': round(sharpe_ratio, 2),
-            'period_days': period_days
-        }
+        # 查询结果已按交易日排序
+        close = np.array([row['close_price'] for row in price_data], dtype=np.float64)
+        return calculate_performance_metrics(close, period_days)
     
     def search_etf_by_keyword(self, keyword: str, limit: int = 20) -> List[Dict[str, Any]]:
         """根据关键词搜索ETF"""
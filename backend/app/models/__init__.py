@@ -2,7 +2,7 @@
 from .base import Base
 from .user import User
 from .strategy import Strategy, StrategyETFAllocation
-from .conversation import Conversation
+from .conversation import Conversation, ConversationSession
 from .etf import (
     ETFBasicInfo, 
     ETFPriceData, 
@@ -19,6 +19,7 @@ __all__ = [
     "Strategy",
     "StrategyETFAllocation",
     "Conversation",
+    "ConversationSession",
     "ETFBasicInfo",
     "ETFPriceData", 
     "ETFPerformanceMetrics",
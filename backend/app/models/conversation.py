@@ -1,5 +1,5 @@
 """对话模型"""
-from sqlalchemy import Column, String, Text, Integer, ForeignKey, JSON, Index
+from sqlalchemy import Column, String, Text, Integer, ForeignKey, JSON, DateTime, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -31,8 +31,42 @@ class Conversation(Base):
         return f"<Conversation(id={self.id}, user_id={self.user_id}, session_id={self.session_id}, type={self.message_type})>"
 
 
+class ConversationSession(Base):
+    """对话会话表（会话列表的汇总数据，随对话记录写入同步更新）"""
+    __tablename__ = "conversation_sessions"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    session_id = Column(String(100), nullable=False, comment="会话ID")
+    message_count = Column(Integer, default=0, nullable=False, comment="消息数量")
+    last_message_preview = Column(String(60), nullable=True, comment="最后一条消息预览（前50个字符）")
+    last_message_time = Column(DateTime, nullable=True, comment="最后一条消息时间")
+    current_stage = Column(String(50), nullable=True, comment="最后一条消息所处的业务阶段")
+    
+    def __repr__(self):
+        return f"<ConversationSession(user_id={self.user_id}, session_id={self.session_id}, count={self.message_count})>"
+
+
 # 创建索引
 Index('idx_conversations_user_id', Conversation.user_id)
 Index('idx_conversations_session_id', Conversation.session_id)
 Index('idx_conversations_status', Conversation.status)
-Index('idx_conversations_created_at', Conversation.created_at)
\ No newline at end of file
+Index('idx_conversations_created_at', Conversation.created_at)
+Index(
+    'idx_conversations_user_session_created',
+    Conversation.user_id,
+    Conversation.session_id,
+    Conversation.created_at.desc(),
+    # PostgreSQL下附带历史查询的列，可仅扫描索引（其他数据库忽略此参数）
+    postgresql_include=['message_type', 'round_number']
+)
+Index(
+    'idx_conversation_sessions_user_session',
+    ConversationSession.user_id,
+    ConversationSession.session_id,
+    unique=True
+)
+Index(
+    'idx_conversation_sessions_user_last_time',
+    ConversationSession.user_id,
+    ConversationSession.last_message_time.desc()
+)
@@ -1,5 +1,5 @@
 """ETF产品模型 - 适配Wind数据库字段"""
-from sqlalchemy import Column, String, Float, Text, Date, Index, Integer
+from sqlalchemy import Column, String, Float, Text, Date, Index, Integer, DDL, event
 from .base import Base
 
 
@@ -118,8 +118,28 @@ class ResearchReports(Base):
 Index('idx_etf_basic_info_code', ETFBasicInfo.etf_code)
 Index('idx_etf_basic_info_asset_class', ETFBasicInfo.asset_class)
 Index('idx_etf_basic_info_fund_company', ETFBasicInfo.fund_company)
+# 列表查询按状态过滤后按规模倒序取前N条，索引顺序与之一致，无需排序
+Index('idx_etf_basic_info_status_scale', ETFBasicInfo.status, ETFBasicInfo.fund_scale.desc())
+# 关键词搜索使用 LIKE '%kw%'，PostgreSQL下用pg_trgm三元组GIN索引支持前导通配符匹配
+Index(
+    'idx_etf_basic_info_search_trgm',
+    ETFBasicInfo.etf_name, ETFBasicInfo.full_name, ETFBasicInfo.asset_class,
+    postgresql_using='gin',
+    postgresql_ops={
+        'etf_name': 'gin_trgm_ops',
+        'full_name': 'gin_trgm_ops',
+        'asset_class': 'gin_trgm_ops'
+    }
+).ddl_if(dialect='postgresql')
 Index('idx_etf_price_data_code_date', ETFPriceData.etf_code, ETFPriceData.trade_date)
 Index('idx_etf_performance_code_period', ETFPerformanceMetrics.etf_code, ETFPerformanceMetrics.period_start_date)
 Index('idx_market_index_code_date', MarketIndexData.index_code, MarketIndexData.trade_date)
 Index('idx_financial_news_source', FinancialNews.source)
 Index('idx_research_reports_institution', ResearchReports.institution)
+
+# 建表前启用pg_trgm扩展（仅PostgreSQL）
+event.listen(
+    ETFBasicInfo.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
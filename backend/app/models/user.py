@@ -1,5 +1,5 @@
 """用户模型"""
-from sqlalchemy import Column, String, Boolean, Index
+from sqlalchemy import Column, String, Boolean, Integer, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -13,6 +13,7 @@ class User(Base):
     nickname = Column(String(50), nullable=True, comment="昵称")
     is_active = Column(Boolean, default=True, nullable=False, comment="是否激活")
     is_new_user = Column(Boolean, default=True, nullable=False, comment="是否新用户")
+    strategy_count = Column(Integer, default=0, nullable=False, comment="策略数量（创建策略时累加）")
     
     # 关联关系
     strategies = relationship("Strategy", back_populates="user", cascade="all, delete-orphan")
@@ -24,11 +25,16 @@ class User(Base):
     @property
     def is_old_user(self) -> bool:
         """是否为老用户（有保存的策略）"""
-        return len(self.strategies) > 0
+        return self.strategy_count > 0
     
-    def update_user_type(self):
-        """更新用户类型"""
-        self.is_new_user = len(self.strategies) == 0
+    def update_user_type(self) -> bool:
+        """更新用户类型，返回类型是否发生变化"""
+        is_new_user = self.strategy_count == 0
+        if self.is_new_user == is_new_user:
+            return False
+        
+        self.is_new_user = is_new_user
+        return True
 
 
 # 创建索引
@@ -40,6 +40,11 @@ class StrategyService:
             )
             
             self.db.add(strategy)
+            # 同步累加用户的策略数量并标记为老用户（同一事务，不再单独提交）
+            self.db.query(User).filter(User.id == user_id).update(
+                {User.strategy_count: User.strategy_count + 1, User.is_new_user: False},
+                synchronize_session=False
+            )
             self.db.commit()
             self.db.refresh(strategy)
             
@@ -60,12 +65,7 @@ class StrategyService:
             
             # 清除用户策略缓存
             await self.cache_service.delete_user_strategies(user_id)
-            
-            # 更新用户类型
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if user and user.is_new_user:
-                user.is_new_user = False
-                self.db.commit()
+            await self.cache_service.delete_user_identity(user_id)
             
             logger.info(f"策略创建成功: {strategy.id}")
             
@@ -185,6 +185,7 @@ class StrategyService:
             # 清除相关缓存
             await self.cache_service.delete_cache(f"strategy:data:{strategy_id}")
             await self.cache_service.delete_user_strategies(user_id)
+            await self.cache_service.delete_user_identity(user_id)
             
             logger.info(f"策略更新成功: {strategy_id}")
             
@@ -219,6 +220,7 @@ class StrategyService:
             # 清除相关缓存
             await self.cache_service.delete_cache(f"strategy:data:{strategy_id}")
             await self.cache_service.delete_user_strategies(user_id)
+            await self.cache_service.delete_user_identity(user_id)
             
             logger.info(f"策略删除成功: {strategy_id}")
             return True
@@ -1,10 +1,17 @@
 """Celery应用配置"""
 from celery import Celery
 from config.settings import settings
+import asyncio
 import logging
+import sys
 
 logger = logging.getLogger(__name__)
 
+# 任务中通过asyncio.run执行的异步调用同样使用uvloop事件循环（uvloop不支持Windows）
+if sys.platform != "win32":
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
 # 创建Celery应用
 celery_app = Celery(
     "etf_strategy_tasks",
@@ -148,14 +148,16 @@ def update_etf_prices(etf_codes: List[str] = None) -> Dict[str, Any]:
             updated_count = 0
             
             with wind_service:
+                # 一次批量获取所有ETF的最新价格数据
+                from datetime import datetime, timedelta
+                end_date = datetime.now().strftime('%Y%m%d')
+                start_date = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+                
+                all_price_data = wind_service.get_etf_price_data_bulk(etf_codes, start_date, end_date)
+                
                 for etf_code in etf_codes:
                     try:
-                        # 获取最新价格数据
-                        from datetime import datetime, timedelta
-                        end_date = datetime.now().strftime('%Y%m%d')
-                        start_date = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
-                        
-                        price_data = wind_service.get_etf_price_data(etf_code, start_date, end_date)
+                        price_data = all_price_data.get(etf_code)
                         
                         if price_data:
                             # 更新ETF产品表中的价格信息
@@ -1,5 +1,5 @@
 """LangChain工具模块 - 集成数据补全和安全审查"""
-from .base_tool import BaseETFTool
+from .base_tool import ETFBaseTool as BaseETFTool
 from .user_identification import UserIdentificationTool
 from .element_extraction import ElementExtractionTool
 from .etf_data_fetch import ETFDataFetchTool
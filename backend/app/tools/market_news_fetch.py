@@ -2,7 +2,7 @@
 from typing import Dict, Any, List, Optional
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
-from app.data.news_service import NewsService
+from app.data.news_service import news_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,24 +23,22 @@ class MarketNewsFetchTool(BaseTool):
     
     def __init__(self):
         super().__init__()
-        self.news_service = NewsService()
+        # 使用全局资讯服务，复用应用生命周期内的HTTP连接池
+        self.news_service = news_service
     
     def _run(self, keywords: Optional[List[str]] = None,
              category: str = "finance",
              limit: int = 10) -> Dict[str, Any]:
         """执行市场资讯获取"""
         try:
-            # 同步包装异步调用
-            import asyncio
-            
             async def fetch_news():
-                async with self.news_service:
-                    if keywords:
-                        return await self.news_service.get_etf_related_news(keywords, limit)
-                    else:
-                        return await self.news_service.get_financial_news(category, limit)
+                if keywords:
+                    return await self.news_service.get_etf_related_news(keywords, limit)
+                else:
+                    return await self.news_service.get_financial_news(category, limit)
             
-            news_data = asyncio.run(fetch_news())
+            # 同步包装异步调用（复用全局资讯服务的HTTP会话）
+            news_data = self.news_service.run_sync(fetch_news)
             
             result = {
                 "success": True,
@@ -67,11 +65,10 @@ class MarketNewsFetchTool(BaseTool):
                    limit: int = 10) -> Dict[str, Any]:
         """异步执行市场资讯获取"""
         try:
-            async with self.news_service:
-                if keywords:
-                    news_data = await self.news_service.get_etf_related_news(keywords, limit)
-                else:
-                    news_data = await self.news_service.get_financial_news(category, limit)
+            if keywords:
+                news_data = await self.news_service.get_etf_related_news(keywords, limit)
+            else:
+                news_data = await self.news_service.get_financial_news(category, limit)
             
             result = {
                 "success": True,
@@ -1,7 +1,9 @@
 """辅助工具函数"""
 # 移除uuid依赖，使用时间戳生成ID
 import hashlib
-from typing import Dict, Any, List
+import secrets
+import sys
+from typing import Dict, Any, List, Optional
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -11,12 +13,11 @@ logger = logging.getLogger(__name__)
 
 
 def generate_session_id() -> str:
-    """生成会话ID"""
-    import time
-    import random
-    timestamp = int(time.time() * 1000000)
-    random_suffix = random.randint(1000, 9999)
-    return f"session_{timestamp}_{random_suffix}"
+    """生成会话ID（16字节随机数的URL安全编码，共22个字符）
+    
+    会话ID在连接表和缓存键中被反复使用，驻留后相同ID共享同一字符串对象。
+    """
+    return sys.intern(secrets.token_urlsafe(16))
 
 
 def generate_task_id() -> str:
@@ -1,15 +1,20 @@
 """ETF资产配置策略系统 - 后端主程序"""
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from contextlib import asynccontextmanager
 import logging
+import sys
 import uvicorn
 
 # 导入配置和模块
 from config.settings import settings
-from app.core.database import init_db
+from app.core.database import init_db, async_engine
 from app.cache.redis_client import redis_client
+from app.core.security import init_password_pool, shutdown_password_pool
+from app.conversation.writer import conversation_writer
+from app.data.news_service import news_service
 from app.api.auth import router as auth_router
 from app.api.conversation import router as conversation_router
 from app.api.strategy import router as strategy_router
@@ -42,6 +47,15 @@ async def lifespan(app: FastAPI):
         logger.info("连接Redis...")
         await redis_client.connect()
         
+        # 创建资讯服务HTTP会话
+        await news_service.startup()
+        
+        # 启动对话记录后台写入
+        conversation_writer.start()
+        
+        # 创建密码校验进程池
+        await init_password_pool()
+        
         logger.info("系统启动完成")
         
     except Exception as e:
@@ -53,7 +67,11 @@ async def lifespan(app: FastAPI):
     # 关闭时执行
     logger.info("关闭系统...")
     try:
+        await conversation_writer.stop()
         await redis_client.disconnect()
+        await news_service.shutdown()
+        await async_engine.dispose()
+        shutdown_password_pool()
         logger.info("系统关闭完成")
     except Exception as e:
         logger.error(f"系统关闭异常: {e}")
@@ -65,7 +83,8 @@ app = FastAPI(
     version=settings.APP_VERSION,
     description="基于LangChain和FastAPI的ETF资产配置策略系统",
     debug=settings.DEBUG,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # 添加CORS中间件
@@ -160,5 +179,8 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
-        log_level=settings.LOG_LEVEL.lower()
+        log_level=settings.LOG_LEVEL.lower(),
+        # uvloop不支持Windows，其他平台使用uvloop事件循环
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        ws="websockets"
     )
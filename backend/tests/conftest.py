@@ -0,0 +1,43 @@
+"""测试公共配置"""
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 应用的全局引擎使用临时SQLite文件，不连接MySQL（须在导入应用模块之前设置）；
+# 测试用例通过下面的fixture使用各自的内存数据库
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'etf_agent_test.db')}"
+)
+
+from app.models import Base
+
+
+@pytest.fixture
+def session_factory():
+    """内存SQLite的同步会话工厂（所有会话共用同一个连接，可在线程中使用）"""
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+async def async_session():
+    """内存SQLite的异步会话"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    
+    await engine.dispose()
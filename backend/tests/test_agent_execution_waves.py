@@ -0,0 +1,140 @@
+"""智能体任务规划分批执行与参数依赖解析测试"""
+import asyncio
+
+import pytest
+
+from app.agent.agent_core import AgentCore, StatusReporter, STRATEGY_GENERATION_TASKS
+
+
+def make_agent(enable_parallel_tool_execution=True):
+    """只构建分批与执行逻辑用到的字段，不创建LLM和工具"""
+    agent = AgentCore.__new__(AgentCore)
+    agent.enable_parallel_tool_execution = enable_parallel_tool_execution
+    return agent
+
+
+def make_task(tool, **params):
+    return {"tool": tool, "params": params, "description": tool}
+
+
+def test_strategy_generation_plan_waves():
+    agent = make_agent()
+    plan = agent._generate_task_plan("strategy_generation", "我想要稳健的策略", {})
+    
+    # 要素提取与ETF数据获取互不依赖；策略生成依赖要素提取，回测依赖策略生成
+    assert [task["tool"] for task in plan] == [
+        "element_extraction_tool", "etf_data_fetch_tool",
+        "strategy_generation_tool", "strategy_backtest_tool"
+    ]
+    assert agent._build_execution_waves(plan) == [[0, 1], [2], [3]]
+
+
+def test_filled_parameter_does_not_wait_for_producer():
+    agent = make_agent()
+    plan = [
+        make_task("element_extraction_tool", conversation_content="..."),
+        make_task("strategy_generation_tool", investment_elements={"risk_level": "低"})
+    ]
+    
+    assert agent._build_execution_waves(plan) == [[0, 1]]
+
+
+def test_missing_producer_does_not_create_dependency():
+    agent = make_agent()
+    plan = [make_task("strategy_backtest_tool", strategy_config={})]
+    
+    assert agent._build_execution_waves(plan) == [[0]]
+
+
+def test_serial_waves_when_parallel_execution_disabled():
+    agent = make_agent(enable_parallel_tool_execution=False)
+    plan = agent._generate_task_plan("strategy_generation", "...", {})
+    
+    assert agent._build_execution_waves(plan) == [[0], [1], [2], [3]]
+
+
+def test_resolve_parameter_dependencies_copies_only_when_filling():
+    agent = make_agent()
+    params = {"investment_elements": {}, "constraints": {}}
+    
+    assert agent._resolve_parameter_dependencies(params, {}) is params
+    
+    resolved = agent._resolve_parameter_dependencies(params, {
+        "element_extraction_tool": {"success": True, "extracted_elements": {"risk_level": "低"}}
+    })
+    assert resolved == {"investment_elements": {"risk_level": "低"}, "constraints": {}}
+    assert params == {"investment_elements": {}, "constraints": {}}
+
+
+async def test_execute_task_plan_runs_waves_and_fills_dependencies():
+    agent = make_agent()
+    plan = agent._generate_task_plan("strategy_generation", "...", {})
+    calls = {}
+    etf_fetch_started = asyncio.Event()
+    
+    async def extract_elements(**params):
+        # 与ETF数据获取在同一批次并发执行，否则会一直等待
+        await asyncio.wait_for(etf_fetch_started.wait(), 1)
+        calls["element_extraction_tool"] = params
+        return {"success": True, "extracted_elements": {"risk_level": "低"}}
+    
+    async def fetch_etf_data(**params):
+        etf_fetch_started.set()
+        calls["etf_data_fetch_tool"] = params
+        return {"success": True, "etf_data": []}
+    
+    async def generate_strategy(**params):
+        calls["strategy_generation_tool"] = params
+        return {"success": True, "strategy": {"name": "稳健策略"}}
+    
+    async def backtest_strategy(**params):
+        calls["strategy_backtest_tool"] = params
+        return {"success": True}
+    
+    execution_context = {}
+    results = await agent._execute_task_plan(plan, execution_context, {
+        "element_extraction_tool": extract_elements,
+        "etf_data_fetch_tool": fetch_etf_data,
+        "strategy_generation_tool": generate_strategy,
+        "strategy_backtest_tool": backtest_strategy
+    }, StatusReporter())
+    
+    assert set(results) == {
+        "task_0_element_extraction_tool", "task_1_etf_data_fetch_tool",
+        "task_2_strategy_generation_tool", "task_3_strategy_backtest_tool"
+    }
+    assert calls["strategy_generation_tool"]["investment_elements"] == {"risk_level": "低"}
+    assert calls["strategy_backtest_tool"]["strategy_config"] == {"name": "稳健策略"}
+    assert execution_context["extracted_elements"] == {"risk_level": "低"}
+    
+    # 模块级的固定任务只读，不会被参数填充修改
+    assert STRATEGY_GENERATION_TASKS[1]["params"]["investment_elements"] == {}
+    assert STRATEGY_GENERATION_TASKS[2]["params"]["strategy_config"] == {}
+
+
+async def test_execute_task_plan_records_failures_and_skips_missing_tools():
+    agent = make_agent()
+    plan = [
+        make_task("element_extraction_tool", conversation_content="..."),
+        make_task("strategy_generation_tool", investment_elements={}),
+        make_task("unknown_tool")
+    ]
+    received = {}
+    
+    async def extract_elements(**params):
+        raise RuntimeError("LLM不可用")
+    
+    async def generate_strategy(**params):
+        received.update(params)
+        return {"success": False}
+    
+    results = await agent._execute_task_plan(plan, {}, {
+        "element_extraction_tool": extract_elements,
+        "strategy_generation_tool": generate_strategy
+    }, StatusReporter())
+    
+    assert results["task_0_error"] == "LLM不可用"
+    # 产出任务失败时依赖参数保持原值
+    assert received == {"investment_elements": {}}
+    assert "task_1_strategy_generation_tool" in results
+    assert not any(key.startswith("task_2") for key in results)
@@ -0,0 +1,105 @@
+"""对话记录写入器测试"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.conversation import writer as writer_module
+from app.conversation.writer import ConversationWriter, PREVIEW_LENGTH
+from app.models.conversation import Conversation, ConversationSession
+
+
+@pytest.fixture(autouse=True)
+def use_test_database(monkeypatch, session_factory):
+    """写入器使用测试数据库"""
+    monkeypatch.setattr(writer_module, "SessionLocal", session_factory)
+
+
+def make_row(session_id, content, created_at, user_id=1, stage=None):
+    return {
+        "user_id": user_id,
+        "session_id": session_id,
+        "message_type": "user",
+        "content": content,
+        "round_number": 1,
+        "context_data": {"stage": stage} if stage else None,
+        "extracted_elements": None,
+        "created_at": created_at
+    }
+
+
+def get_summary(session_factory, session_id):
+    with session_factory() as db:
+        return db.query(ConversationSession).filter(
+            ConversationSession.session_id == session_id
+        ).one()
+
+
+def test_write_batch_creates_session_summary(session_factory):
+    start = datetime(2024, 1, 1, 9, 0)
+    ConversationWriter._write_batch([
+        make_row("s1", "你好", start),
+        make_row("s1", "我想了解ETF", start + timedelta(seconds=1), stage="risk_assessment"),
+        make_row("s2", "其他会话", start, user_id=2)
+    ])
+    
+    summary = get_summary(session_factory, "s1")
+    assert summary.user_id == 1
+    assert summary.message_count == 2
+    assert summary.last_message_preview == "我想了解ETF"
+    assert summary.last_message_time == start + timedelta(seconds=1)
+    assert summary.current_stage == "risk_assessment"
+    assert summary.created_at == start
+    
+    assert get_summary(session_factory, "s2").message_count == 1
+    with session_factory() as db:
+        assert db.query(Conversation).count() == 3
+
+
+def test_write_batch_updates_existing_session_summary(session_factory):
+    start = datetime(2024, 1, 1, 9, 0)
+    ConversationWriter._write_batch([make_row("s1", "第一条", start, stage="intro")])
+    
+    long_content = "很" * (PREVIEW_LENGTH + 10)
+    ConversationWriter._write_batch([
+        make_row("s1", "第二条", start + timedelta(seconds=1)),
+        make_row("s1", long_content, start + timedelta(seconds=2))
+    ])
+    
+    summary = get_summary(session_factory, "s1")
+    assert summary.message_count == 3
+    assert summary.last_message_preview == long_content[:PREVIEW_LENGTH] + "..."
+    assert summary.last_message_time == start + timedelta(seconds=2)
+    assert summary.current_stage is None
+    assert summary.created_at == start
+    
+    with session_factory() as db:
+        assert db.query(ConversationSession).count() == 1
+
+
+def test_write_rows_retries_rows_individually_when_batch_fails(session_factory):
+    start = datetime(2024, 1, 1, 9, 0)
+    bad_row = make_row("s2", None, start)  # 内容为空的记录写入失败，整批失败
+    
+    ConversationWriter._write_rows([
+        make_row("s1", "第一条", start),
+        bad_row,
+        make_row("s1", "第二条", start + timedelta(seconds=1))
+    ])
+    
+    assert get_summary(session_factory, "s1").message_count == 2
+    with session_factory() as db:
+        assert db.query(Conversation).count() == 2
+        assert db.query(ConversationSession).filter(
+            ConversationSession.session_id == "s2"
+        ).count() == 0
+
+
+async def test_enqueue_writes_rows_in_background(session_factory):
+    writer = ConversationWriter(batch_size=10, flush_interval=0.01)
+    writer.enqueue(1, "s1", "user", "你好", context_data={"stage": "intro"})
+    writer.enqueue(1, "s1", "assistant", "您好！")
+    await writer.stop()
+    
+    summary = get_summary(session_factory, "s1")
+    assert summary.message_count == 2
+    assert summary.last_message_preview == "您好！"
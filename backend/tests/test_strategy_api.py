@@ -0,0 +1,74 @@
+"""策略API测试"""
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.api import strategy as strategy_api
+from app.models.strategy import Strategy
+from app.models.user import User
+
+
+@pytest.fixture
+async def users(async_session):
+    owner = User(phone_number="13800000001", password_hash="x")
+    other = User(phone_number="13800000002", password_hash="x")
+    async_session.add_all([owner, other])
+    await async_session.commit()
+    return owner, other
+
+
+@pytest.fixture
+async def strategy(async_session, users):
+    owner, _ = users
+    strategy = Strategy(user_id=owner.id, name="稳健策略")
+    async_session.add(strategy)
+    await async_session.commit()
+    return strategy
+
+
+@pytest.fixture(autouse=True)
+def cleared_identities(monkeypatch):
+    """记录被清除身份缓存的用户，不访问Redis"""
+    cleared = []
+    
+    async def delete_user_identity(user_id):
+        cleared.append(user_id)
+        return True
+    
+    monkeypatch.setattr(strategy_api.cache_service, "delete_user_identity", delete_user_identity)
+    return cleared
+
+
+async def get_status(async_session, strategy_id):
+    return await async_session.scalar(select(Strategy.status).where(Strategy.id == strategy_id))
+
+
+async def test_delete_strategy_soft_deletes_own_strategy(async_session, users, strategy, cleared_identities):
+    owner, _ = users
+    
+    response = await strategy_api.delete_strategy(strategy.id, current_user=owner, db=async_session)
+    
+    assert response == {"success": True, "message": "策略删除成功"}
+    assert await get_status(async_session, strategy.id) == "deleted"
+    assert cleared_identities == [owner.id]
+
+
+async def test_delete_strategy_of_other_user_returns_404(async_session, users, strategy, cleared_identities):
+    _, other = users
+    
+    with pytest.raises(HTTPException) as exc_info:
+        await strategy_api.delete_strategy(strategy.id, current_user=other, db=async_session)
+    
+    assert exc_info.value.status_code == 404
+    assert await get_status(async_session, strategy.id) == "active"
+    assert cleared_identities == []
+
+
+async def test_delete_missing_or_deleted_strategy_returns_404(async_session, users, strategy):
+    owner, _ = users
+    await strategy_api.delete_strategy(strategy.id, current_user=owner, db=async_session)
+    
+    for strategy_id in (strategy.id, strategy.id + 1):
+        with pytest.raises(HTTPException) as exc_info:
+            await strategy_api.delete_strategy(strategy_id, current_user=owner, db=async_session)
+        assert exc_info.value.status_code == 404
@@ -112,6 +112,13 @@ class WebSocketService {
       case 'strategy_update':
         this.eventHandlers.strategy_update?.(data);
         break;
+      case 'connection_established':
+        // 服务端的连接确认，连接事件已在onopen中处理
+        break;
+      case 'batch':
+        // 服务端合并发送的多条消息，逐条处理
+        (data as WebSocketMessage[]).forEach((item) => this.handleMessage(item));
+        break;
       default:
         console.warn('未知的WebSocket消息类型:', type);
     }
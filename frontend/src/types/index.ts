@@ -126,7 +126,7 @@ export interface ETFProduct {
 
 // WebSocket消息类型
 export interface WebSocketMessage {
-  type: 'message' | 'status_update' | 'error' | 'strategy_update';
+  type: 'message' | 'status_update' | 'error' | 'strategy_update' | 'batch' | 'connection_established';
   data: any;
 }
 